@@ -1,26 +1,287 @@
 import streamlit as st
 import pandas as pd
-import uuid
 from bs4 import BeautifulSoup
 import pymongo
-import streamlit_analytics
 from datetime import datetime
 from bson.objectid import ObjectId
 import numpy as np
-import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+from vector_index import NumpyVectorIndex, DEFAULT_FILTER_FIELDS
+from seen_articles import SeenArticleSet
+from embedding_math import embedding_update_pipeline, embedding_version
+from vector_codec import decode_vector
+from cards import CARD_PROJECTION, render_article_card, card_highlights
+from write_behind import WriteBehindQueue
+from candidate_cache import CandidateCache, candidate_page
+from indexes import ensure_indexes, explain_page_queries, index_problems, duplicate_usernames, FEEDBACK_UNIQUE_INDEX, USERNAME_UNIQUE_INDEX
+from category_tree import CategoryTreeCache
+from recommendations import recommendation_id, is_fresh, merge_candidates
 # --- MongoDB Setup ---
-MONGO_URI = st.secrets["MONGO"]["uri"]
-if not MONGO_URI:
-    st.error("MongoDB URI is not set in the environment variables.")
-    st.stop()  # Stop the app if MongoDB URI is missing
-client = pymongo.MongoClient(MONGO_URI)
-db = client["techcrunch_db"]
-top_stories = db["top_stories"]
-rankings_collection = db["rankings"]  # MongoDB collection for rankings
-satisfaction_collection = db["satisfaction"]  # MongoDB collection for satisfaction
-users_collection = db["users"]  # MongoDB collection for users
-highlight_feedback_collection = db["highlight_feedback"]
-user_article_feedback_collection = db["user_article_feedback"]
+# Collection handles connect through the shared client on first use, not at import
+from database import (
+    CollectionHandle,
+    top_stories,
+    rankings_collection,
+    users_collection,
+    user_article_feedback_collection,
+    article_popularity_collection,
+    new_init_collection,
+    recommendations_collection,
+    get_database,
+    get_query_stats
+)
+
+# --- Vector Search Backend ---
+# "atlas" runs $vectorSearch on the Atlas search index, "numpy" ranks in process
+# so the app also works against a plain mongod.
+VECTOR_SEARCH_CONFIG = st.secrets.get("VECTOR_SEARCH", {})
+VECTOR_SEARCH_BACKEND = VECTOR_SEARCH_CONFIG.get("backend", "atlas")
+# Fields a search can be pre-filtered on; must match the filter fields of the
+# Atlas index (scripts/manage_vector_index.py creates it from this setting).
+# Already-seen articles are not part of the pre-filter: that would put each
+# user's whole feedback history into the query, so they are skipped client-side
+# from the cached candidate ranking (see candidate_page).
+VECTOR_SEARCH_FILTER_FIELDS = VECTOR_SEARCH_CONFIG.get("filter_fields", list(DEFAULT_FILTER_FIELDS))
+
+@st.cache_resource
+def get_numpy_vector_index():
+    """Process-wide in-memory index over top_stories.response_array"""
+    index = NumpyVectorIndex(
+        top_stories,
+        path="response_array",
+        metric=VECTOR_SEARCH_CONFIG.get("metric", "cosine"),
+        refresh_interval=VECTOR_SEARCH_CONFIG.get("refresh_interval", 60),
+        filter_fields=VECTOR_SEARCH_FILTER_FIELDS
+    )
+    index.refresh(force=True)
+    return index
+
+def vector_search_stages(query_vector, num_candidates, limit, search_filter=None):
+    """
+    Build the leading aggregation stages that rank top_stories by similarity.
+
+    Both backends emit documents best match first with their similarity in
+    `vector_score`, so the stages that follow (filtering, paging, limiting)
+    behave the same regardless of backend.
+
+    Args:
+    - query_vector (list): Embedding vector for similarity search
+    - num_candidates (int): Candidates considered by Atlas (the numpy backend is exact)
+    - limit (int): Number of ranked documents to emit
+    - search_filter (dict, optional): Pre-filter on VECTOR_SEARCH_FILTER_FIELDS, applied
+      before ranking so narrow windows still fill `limit`
+
+    Returns:
+    - List of pipeline stages
+    """
+    if VECTOR_SEARCH_BACKEND == "numpy":
+        ranked = get_numpy_vector_index().search(query_vector, limit, search_filter)
+        ranked_ids = [article_id for article_id, _ in ranked]
+        scores = [score for _, score in ranked]
+        return [
+            {"$match": {"_id": {"$in": ranked_ids}}},
+            {"$addFields": {"_vector_rank": {"$indexOfArray": [ranked_ids, "$_id"]}}},
+            {"$addFields": {"vector_score": {"$arrayElemAt": [scores, "$_vector_rank"]}}},
+            {"$sort": {"_vector_rank": 1}},
+            {"$project": {"_vector_rank": 0}}
+        ]
+    vector_search = {
+        "index": "vector_index",
+        "path": "response_array",
+        "queryVector": query_vector,
+        "numCandidates": num_candidates,
+        "limit": limit
+    }
+    if search_filter:
+        vector_search["filter"] = search_filter
+    return [
+        {"$vectorSearch": vector_search},
+        {"$addFields": {"vector_score": {"$meta": "vectorSearchScore"}}}
+    ]
+
+# --- Vector Candidate Cache ---
+# Deep retrieval size; pages are then cut locally from the cached ranking
+CANDIDATE_DEPTH = VECTOR_SEARCH_CONFIG.get("candidate_depth", 500)
+
+@st.cache_resource
+def get_candidate_cache():
+    """Process-wide cache of ranked vector search candidates, shared by all sessions"""
+    return CandidateCache(
+        maxsize=VECTOR_SEARCH_CONFIG.get("candidate_cache_size", 256),
+        ttl=VECTOR_SEARCH_CONFIG.get("candidate_ttl", 600)
+    )
+
+def retrieve_candidates(user_embedding, search_filter=None):
+    """
+    Run one deep vector retrieval and return ids and scores only.
+    
+    Args:
+    - user_embedding (list): Query vector
+    - search_filter (dict, optional): Pre-filter passed to the vector search
+    
+    Returns:
+    - List of (article id, score) pairs sorted by (score, id) descending
+    """
+    pipeline = vector_search_stages(
+        user_embedding, num_candidates=CANDIDATE_DEPTH, limit=CANDIDATE_DEPTH, search_filter=search_filter
+    )
+    pipeline.append({"$project": {"_id": 1, "vector_score": 1}})
+    candidates = [(article["_id"], article["vector_score"]) for article in top_stories.aggregate(pipeline)]
+    candidates.sort(key=lambda candidate: (candidate[1], candidate[0]), reverse=True)
+    return candidates
+
+# Nightly precomputed candidates (scripts/compute_recommendations.py)
+RECOMMENDATIONS_CONFIG = st.secrets.get("RECOMMENDATIONS", {})
+
+def load_recommended_candidates(user_name, user_embedding, start_date, end_date):
+    """
+    Return the precomputed candidates for a date window, if a fresh entry exists.
+    
+    An entry is used only if it was computed from the user's current embedding
+    within [RECOMMENDATIONS] max_age seconds (default 26 hours, one nightly run
+    plus slack). The nightly job only saw articles published before it ran, so
+    for a window ending after that (e.g. today) the rest of the window is
+    retrieved live and merged in.
+    
+    Args:
+    - user_name (str): Username of the user
+    - user_embedding (list): The user's current embedding
+    - start_date (datetime): Window start
+    - end_date (datetime): Window end
+    
+    Returns:
+    - List of (article id, score) pairs sorted by (score, id) descending, or None
+    """
+    if not RECOMMENDATIONS_CONFIG.get("enabled", True):
+        return None
+    recommendation = recommendations_collection.find_one({"_id": recommendation_id(user_name, start_date, end_date)})
+    if recommendation is None or not is_fresh(
+        recommendation, embedding_version(user_embedding), RECOMMENDATIONS_CONFIG.get("max_age", 26 * 3600)
+    ):
+        return None
+    candidates = [(article_id, score) for article_id, score in recommendation["candidates"]]
+    if end_date <= recommendation["generated_at"]:
+        return candidates
+    recent = retrieve_candidates(user_embedding, {"published": {"$gt": recommendation["generated_at"], "$lte": end_date}})
+    return merge_candidates(candidates, recent)
+
+def get_vector_candidates(user_name, user_embedding, start_date=None, end_date=None, feedback_count=None):
+    """
+    Ranked candidates for a user and date window, from the cache when possible.
+    
+    Uses no Streamlit calls beyond the cached resource, so it can also run on
+    the prefetch workers.
+    
+    Args:
+    - user_name (str): Owner of the embedding; used to invalidate on update
+    - user_embedding (list): The user's current embedding
+    - start_date, end_date (datetime, optional): Published window
+    - feedback_count (int, optional): The user's feedback count; keyed with the embedding as in the Curated page's prefetch key
+    
+    Returns:
+    - List of (article id, score) pairs, best match first
+    """
+    # The window is a vector search pre-filter, so retrieval work scales with the window
+    search_filter = {"published": {"$gte": start_date, "$lte": end_date}} if start_date and end_date else None
+    key = (user_name, embedding_version(user_embedding, feedback_count), start_date, end_date)
+    
+    def load():
+        # A fresh nightly entry saves the live retrieval
+        if start_date and end_date:
+            recommended = load_recommended_candidates(user_name, user_embedding, start_date, end_date)
+            if recommended is not None:
+                return recommended
+        return retrieve_candidates(user_embedding, search_filter)
+    
+    return get_candidate_cache().get(key, load)
+
+def hydrate_candidates(candidates):
+    """
+    Fetch the card fields of ranked candidates with one $in query.
+    
+    Args:
+    - candidates (list): (article id, score) pairs to show, in order
+    
+    Returns:
+    - Articles in the same order with vector_score set; deleted articles are skipped
+    """
+    found = {
+        article["_id"]: article
+        for article in top_stories.find({"_id": {"$in": [article_id for article_id, _ in candidates]}}, CARD_PROJECTION)
+    }
+    articles = []
+    for article_id, score in candidates:
+        if article_id in found:
+            found[article_id]["vector_score"] = score
+            articles.append(found[article_id])
+    return articles
+
+def load_response_arrays(article_ids):
+    """
+    Fetch the embeddings of scored articles with one $in query.
+    
+    Listing queries project CARD_PROJECTION, which leaves response_array out,
+    so embeddings are only transferred when scores are submitted.
+    
+    Args:
+    - article_ids (list): Ids of the scored articles
+    
+    Returns:
+    - Dict of article id to stored response_array; articles without one are omitted
+    """
+    return {
+        article["_id"]: article["response_array"]
+        for article in top_stories.find(
+            {"_id": {"$in": list(article_ids)}, "response_array": {"$exists": True}},
+            {"response_array": 1}
+        )
+    }
+
+# --- Keyset Pagination ---
+def page_token(article, sort_field=None):
+    """
+    Build a cursor token that resumes a listing right after `article`.
+    
+    Args:
+    - article (dict): Last article of the current page
+    - sort_field (str, optional): Field the listing is sorted on before _id
+    
+    Returns:
+    - Token dict holding _id and, if given, the sort field value
+    """
+    token = {"_id": article["_id"]}
+    if sort_field:
+        token[sort_field] = article.get(sort_field)
+    return token
+
+def keyset_match(after, sort_field=None, descending=True):
+    """
+    Query matching documents strictly after a page token.
+    
+    The listing must be sorted on (sort_field, _id) in the given direction,
+    so the server can seek straight to the next page instead of skipping.
+    
+    Args:
+    - after (dict, optional): Token from page_token, or None for the first page
+    - sort_field (str, optional): Field the listing is sorted on before _id
+    - descending (bool): Direction of the sort
+    
+    Returns:
+    - Query dict (empty for the first page)
+    """
+    if not after:
+        return {}
+    op = "$lt" if descending else "$gt"
+    if not sort_field:
+        return {"_id": {op: after["_id"]}}
+    return {
+        "$or": [
+            {sort_field: {op: after[sort_field]}},
+            {sort_field: after[sort_field], "_id": {op: after["_id"]}}
+        ]
+    }
+
 initial_centroids = np.array([
     [1, 1, 3, 3, 4, 1, 3, 3, 1, 1, 3],  # DATA-DRIVEN Analyst
     [4, 4, 3, 4, 4, 4, 3, 3, 4, 4, 3],  # engaging storyteller
@@ -34,91 +295,143 @@ persona_index = {
     "Balanced Evaluator": 3
 }
 def clear_article_session_data():
-    session_keys = ["articles_data", "article_content", "articles_offset", "latest_articles", "latest_articles_offset", "random_article_contents", "random_articles" "popular_articles", "popular_article_contents",]
+    session_keys = ["articles_data", "article_content", "articles_page_token", "latest_articles", "latest_articles_offset", "random_article_contents", "random_articles", "random_article_pool", "random_pool_refill", "random_shown_ids", "popular_articles", "popular_article_contents", "seen_articles", "curated_prefetch", "user_profiles"]
     for key in session_keys:
         if key in st.session_state:
             del st.session_state[key]
+# --- User Profile Cache ---
+# Fields of the users document the pages read; fetched once per session
+USER_PROFILE_FIELDS = {
+    "_id": 0,
+    "username": 1,
+    "persona": 1,
+    "user_embedding": 1,
+    "feedback_count": 1,
+    "user_interests": 1,
+    "initialized": 1
+}
+
+def get_user_profile(username):
+    """
+    Return the session's cached profile of a user, loading it on first use.
+    
+    Pages read the profile on every rerun, so it is kept in session state and
+    refreshed only through update_user_profile / invalidate_user_profile or a
+    new login. Unknown users are not cached, so a user added later can log in.
+    
+    Args:
+    - username (str): Username of the user
+    
+    Returns:
+    - Dict with the USER_PROFILE_FIELDS the user has, or None if the user does not exist
+    """
+    if not username:
+        return None
+    if "user_profiles" not in st.session_state:
+        st.session_state.user_profiles = {}
+    if username not in st.session_state.user_profiles:
+        profile = users_collection.find_one({"username": username}, USER_PROFILE_FIELDS)
+        if profile is None:
+            return None
+        st.session_state.user_profiles[username] = profile
+    return st.session_state.user_profiles[username]
+
+def update_user_profile(username, fields):
+    """
+    Write fields to the user's document and to the cached profile.
+    
+    Args:
+    - username (str): Username of the user
+    - fields (dict): Values to $set
+    """
+    users_collection.update_one({"username": username}, {"$set": fields})
+    patch_user_profile(username, fields)
+
+def patch_user_profile(username, fields):
+    """Apply values already written to the database to the cached profile"""
+    profile = st.session_state.get("user_profiles", {}).get(username)
+    if profile is not None:
+        profile.update(fields)
+
+def invalidate_user_profile(username):
+    """Drop the cached profile so the next read goes to the database"""
+    st.session_state.get("user_profiles", {}).pop(username, None)
+
+@st.cache_resource
+def get_category_tree_cache():
+    """
+    Process-wide cache of the Initialization category tree.
+    
+    [CATEGORY_TREE] ttl (seconds, default 300) sets how often the cached tree
+    is checked against the document's `version`.
+    """
+    return CategoryTreeCache(new_init_collection, ttl=st.secrets.get("CATEGORY_TREE", {}).get("ttl", 300))
+
 # --- User Authentication Function ---
 def authenticate_user(username):
     """Check if the username exists in the users collection"""
-    user = users_collection.find_one({"username": username})
-    return user is not None
+    return get_user_profile(username) is not None
 
 def check_user_initialized(username):
     """Check if the user has completed initialization (has a persona)"""
-    user = users_collection.find_one({"username": username})
+    user = get_user_profile(username)
     return user is not None and "persona" in user
 
 # --- Common Functions ---
 def clean_html(raw_html):
     return BeautifulSoup(raw_html, "html.parser").get_text()
 
-def remove_footer_text(summary):
-    index = summary.find("©")
-    if index != -1:
-        return summary[:index].rstrip()  # Remove footer and trailing whitespace
-    return summary  # Return unchanged
-
-def load_articles_vector_search(user_name, user_embedding, offset=0, limit=5):
+def load_articles_vector_search(user_name, user_embedding, offset=0, limit=5, after=None, feedback_count=None):
     """
     Load articles using a vector search query on the top_stories collection,
     excluding articles the user has already provided feedback on.
     
+    The ranking comes from the candidate cache, so only the displayed
+    documents are read.
+    
     Args:
     - user_name (str): Username to filter out previously rated articles
     - user_embedding (list): Embedding vector for similarity search
-    - offset (int): Number of documents to skip
+    - offset (int): Number of unseen candidates to skip when no token is given
     - limit (int): Number of documents to retrieve
+    - after (dict, optional): page_token(article, "vector_score") to resume after
+    - feedback_count (int, optional): The user's feedback count, part of the candidate cache key
     
     Returns:
-    - List of articles
+    - List of articles, best match first
     """
     try:
-        # Get IDs of articles user has already provided feedback on
-        feedback_article_ids = get_user_feedback_article_ids(user_name)
-        
-        # Convert feedback article IDs to ObjectId
-        feedback_article_ids = [ObjectId(article_id) for article_id in feedback_article_ids]
-        
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "vector_index",
-                    "path": "response_array",
-                    "queryVector": user_embedding,
-                    "numCandidates": 300,
-                    # Get enough candidates so that we can later skip 'offset' and limit to 'limit'
-                    "limit": offset + limit + len(feedback_article_ids)  # Increase to account for filtered out articles
-                }
-            },
-            {
-                "$match": {
-                    "_id": {"$nin": feedback_article_ids}  # Exclude articles with feedback
-                }
-            },
-            {
-                "$setWindowFields": {
-                    "sortBy": { "_id": 1 },
-                    "output": {
-                        "row_number": { "$documentNumber": {} }
-                    }
-                }
-            },
-            {
-                "$match": { "row_number": { "$gt": offset } }
-            },
-            {
-                "$limit": limit
-            }
-        ]
-        
-        results = list(db.top_stories.aggregate(pipeline))
-        return results
+        # Articles user has already provided feedback on
+        seen_articles = get_seen_articles(user_name)
+        candidates = get_vector_candidates(user_name, user_embedding, feedback_count=feedback_count)
+        if after:
+            page, _ = candidate_page(candidates, after, limit, seen_articles)
+        else:
+            page, _ = candidate_page(candidates, None, offset + limit, seen_articles)
+            page = page[offset:]
+        return hydrate_candidates(page)
     
     except Exception as e:
         st.error(f"Error loading articles with vector search: {e}")
         return []
 
+@st.cache_resource
+def ensure_app_indexes():
+    """
+    Create the indexes the page queries rely on, once per process.
+    
+    The unique (user_name, article_id, feedback_type) index is what makes the
+    feedback upserts idempotent. Indexes that cannot be built (e.g. duplicate
+    feedback rows or usernames blocking a unique index) are shown in the Admin
+    Panel, where "Check Indexes" retries them, and the app carries on. The app
+    never deletes data to make a build succeed; scripts/dedupe_feedback.py does
+    that for feedback rows.
+    
+    Returns:
+    - Report from indexes.ensure_indexes
+    """
+    return ensure_indexes(get_database(), RANDOM_SAMPLING_CONFIG.get("stratify_by"))
+
 def track_user_article_feedback(user_name, article_id, feedback_type):
     """
     Track user's feedback on a specific article.
@@ -128,25 +441,58 @@ def track_user_article_feedback(user_name, article_id, feedback_type):
     - article_id (str): Unique identifier of the article
     - feedback_type (str): Type of feedback (e.g., 'ranking', 'highlight')
     """
+    track_user_article_feedback_bulk(user_name, [article_id], feedback_type)
+
+def track_user_article_feedback_bulk(user_name, article_ids, feedback_type):
+    """
+    Track user's feedback on several articles with one unordered bulk upsert.
+    
+    The unique (user_name, article_id, feedback_type) index makes this
+    idempotent: resubmitting, or two tabs submitting at once, cannot create
+    duplicate records.
+    
+    Args:
+    - user_name (str): Username of the user
+    - article_ids (list): Identifiers of the articles
+    - feedback_type (str): Type of feedback (e.g., 'ranking', 'highlight')
+    
+    Returns:
+    - Dict with the number of records "inserted" and already "existing"
+    """
+    counts = {"inserted": 0, "existing": 0}
+    article_ids = list(dict.fromkeys(str(article_id) for article_id in article_ids))
+    if not article_ids:
+        return counts
     try:
-        # Check if feedback already exists
-        existing_feedback = user_article_feedback_collection.find_one({
-            "user_name": user_name,
-            "article_id": str(article_id),
-            "feedback_type": feedback_type
-        })
+        ensure_app_indexes()
+        timestamp = datetime.now()
+        operations = [
+            pymongo.UpdateOne(
+                {"user_name": user_name, "article_id": article_id, "feedback_type": feedback_type},
+                {"$setOnInsert": {"timestamp": timestamp}},
+                upsert=True
+            )
+            for article_id in article_ids
+        ]
+        try:
+            result = user_article_feedback_collection.bulk_write(operations, ordered=False)
+            counts["inserted"] = result.upserted_count
+        except pymongo.errors.BulkWriteError as e:
+            # A concurrent submit inserted the same record first; that is not a failure
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            counts["inserted"] = e.details.get("nUpserted", 0)
+        counts["existing"] = len(article_ids) - counts["inserted"]
         
-        if not existing_feedback:
-            # If no existing feedback, insert a new document
-            feedback_record = {
-                "user_name": user_name,
-                "article_id": str(article_id),
-                "feedback_type": feedback_type,
-                "timestamp": datetime.now()
-            }
-            user_article_feedback_collection.insert_one(feedback_record)
+        # Keep the cached seen set in step with the database
+        seen_articles = st.session_state.get("seen_articles", {}).get(user_name)
+        if seen_articles is not None:
+            for article_id in article_ids:
+                seen_articles.add(article_id)
     except Exception as e:
         st.error(f"Error tracking user article feedback: {e}")
+    return counts
 
 def get_user_feedback_article_ids(user_name, feedback_type=None):
     """
@@ -165,32 +511,56 @@ def get_user_feedback_article_ids(user_name, feedback_type=None):
             query["feedback_type"] = feedback_type
         
         # Retrieve all article IDs with feedback
-        feedback_records = user_article_feedback_collection.find(query)
+        feedback_records = user_article_feedback_collection.find(query, {"article_id": 1, "_id": 0})
         return [record["article_id"] for record in feedback_records]
     except Exception as e:
         st.error(f"Error retrieving user feedback article IDs: {e}")
         return []
 
-def load_latest_articles_excluding_feedback(user_name, limit=5):
+def get_seen_articles(user_name):
+    """
+    Return the cached set of article IDs the user has already provided feedback on.
+    
+    The set is loaded once per session and kept current by track_user_article_feedback,
+    so loaders can filter candidates client-side instead of sending a $nin list.
+    
+    Args:
+    - user_name (str): Username of the user
+    
+    Returns:
+    - SeenArticleSet
+    """
+    if "seen_articles" not in st.session_state:
+        st.session_state.seen_articles = {}
+    if user_name not in st.session_state.seen_articles:
+        st.session_state.seen_articles[user_name] = SeenArticleSet(get_user_feedback_article_ids(user_name))
+    return st.session_state.seen_articles[user_name]
+
+def load_latest_articles_excluding_feedback(user_name, limit=5, after=None):
     """
     Load articles excluding those the user has already given feedback on.
     
     Args:
     - user_name (str): Username of the user
     - limit (int): Number of articles to retrieve
+    - after (dict, optional): page_token(last_article, "published") to continue after
     
     Returns:
     - List of articles
     """
     try:
-        # Get IDs of articles user has already provided feedback on
-        feedback_article_ids = get_user_feedback_article_ids(user_name)
+        # Articles user has already provided feedback on
+        seen_articles = get_seen_articles(user_name)
         
-        # Construct a query to exclude these articles
-        query = {"_id": {"$nin": [ObjectId(article_id) for article_id in feedback_article_ids]}}
-        
-        # Retrieve new articles
-        new_articles = list(top_stories.find(query).sort("published", -1).limit(limit))
+        # Retrieve new articles, skipping rated ones as the cursor is read. No limit:
+        # reading stops once `limit` are found, so the batches fetched do not grow
+        # with the user's feedback history
+        cursor = (
+            top_stories.find(keyset_match(after, "published"), CARD_PROJECTION)
+            .sort([("published", -1), ("_id", -1)])
+            .batch_size(2 * limit)
+        )
+        new_articles = seen_articles.take_unseen(cursor, limit=limit)
         # If not enough articles, fill with random articles
         # if len(new_articles) < limit:
         #     additional_articles = list(top_stories.aggregate([
@@ -206,171 +576,213 @@ def load_latest_articles_excluding_feedback(user_name, limit=5):
     
 
 def format_article(article):
-    title = str(article.get("title", "Unknown Title"))
-    raw_content = str(article.get("summary", "No summary available"))
-    
-    # Clean the full text
-    cleaned = clean_html(raw_content)
-    # Create the truncated version (first 150 characters)
-    truncated = cleaned[:150]
-    was_truncated = len(cleaned) > 150
-    
-    # Check if a footer appears in the truncated part
-    if "©" in truncated:
-        content = remove_footer_text(truncated)
-    else:
-        content = truncated.rstrip()
-        if was_truncated:
-            content += "..."
-    
-    url = article.get("link", "#")
-    raw_published_date = article.get("published", None)
-    if raw_published_date:
-        formatted_date = raw_published_date
-    else:
-        formatted_date = "No publication date available"
-
-    authors = article.get("authors", [])
-    authors_text = ", ".join(authors) if authors else "No author information available"
-    duration = article.get("duration", None)
-    distance = article.get("distance", "N/A")
-    if distance == "N/A":
-        article_html = f"""
-            <a href="{url}" target="_blank">
-                <div class="article-card">
-                    <h3 style="font-size: 20px; font-weight: bold;">{title}</h3>
-                    <p style="font-size: 16px; color: inherit;">{content}</p>
-                    <p class="inline-info"><span>Published:</span> {formatted_date},</p>
-                    <p class="inline-info"><span>Author(s):</span> {authors_text},</p>
-                    <p class="inline-info"><span>Duration:</span> {duration}</p>
-                </div>
-            </a>
-        """
-    else:
-            article_html = f"""
-        <a href="{url}" target="_blank">
-            <div class="article-card">
-                <h3 style="font-size: 20px; font-weight: bold;">{title}</h3>
-                <p style="font-size: 16px; color: inherit;">{content}</p>
-                <p class="inline-info"><span>Published:</span> {formatted_date},</p>
-                <p class="inline-info"><span>Author(s):</span> {authors_text},</p>
-                <p class="inline-info"><span>Duration:</span> {duration},</p>
-                <p class="inline-info"><span>Distance:</span> {distance}</p>
-            </div>
-        </a>
-    """
-    return article_html
+    """Return the card HTML for an article"""
+    # Precomputed display fields make this an f-string; otherwise only the
+    # visible summary prefix is parsed. Either is cheaper than a cache lookup.
+    return render_article_card(article)
+
+@st.cache_resource
+def get_prefetch_executor():
+    """Process-wide worker pool that loads the next page of articles ahead of Load More"""
+    return ThreadPoolExecutor(
+        max_workers=st.secrets.get("PREFETCH", {}).get("max_workers", 4),
+        thread_name_prefix="prefetch"
+    )
 
-def update_negative_embedding_combined(current_embedding, article_response_array, global_embedding_centroid):
+def update_user_embedding(users_collection, user_name, article_response_array, feedback_score):
     """
-    Combine multiple strategies for more robust negative feedback update.
+    Update the user's embedding with sophisticated handling of negative feedback.
     
     Args:
-    - current_embedding: Current user embedding
-    - article_response_array: Embedding of the current article
-    - global_embedding_centroid: Average embedding of all articles
+    - users_collection: MongoDB collection for users
+    - user_name: Username of the current user
+    - article_response_array: Response array from the current article
+    - feedback_score: Score given to the article (-1, 0, or 1)
     
     Returns:
-    - Updated embedding
+    - Updated user embedding as a list of 11 floats
     """
-    # Calculate Euclidean distance
-    distance = math.sqrt(
-        sum((current_embedding[i] - article_response_array[i])**2 for i in range(len(current_embedding)))
-    )
-    
-    # Randomized perturbation
-    perturbation = np.random.normal(
-        loc=0, 
-        scale=0.3,  # Controlled randomness
-        size=len(current_embedding)
-    )
-    
-    # Combine multiple strategies
-    updated_embedding = [
-        current_embedding[i] + 
-        0.4 * (global_embedding_centroid[i] - article_response_array[i]) +  # Global centroid push
-        0.3 * (current_embedding[i] - article_response_array[i]) * (1 / (1 + distance)) +  # Distance-scaled push
-        0.3 * perturbation[i]  # Random perturbation
-        for i in range(len(current_embedding))
-    ]
-    
-    return updated_embedding
+    return update_user_embedding_batch(users_collection, user_name, [(article_response_array, feedback_score)])
 
-def update_user_embedding(users_collection, user_name, article_response_array, feedback_score):
+def update_user_embedding_batch(users_collection, user_name, article_feedback):
     """
-    Update the user's embedding with sophisticated handling of negative feedback.
+    Fold a whole submission into the user's embedding with one atomic update.
+    
+    The embedding is stored as sufficient statistics (embedding_sum and
+    embedding_weight), so the update pipeline needs no prior read and two
+    tabs submitting at once cannot overwrite each other's feedback. Scores are
+    applied in order, so the result is the same as calling update_user_embedding
+    once per article.
     
     Args:
     - users_collection: MongoDB collection for users
     - user_name: Username of the current user
-    - article_response_array: Response array from the current article
-    - feedback_score: Score given to the article (-1, 0, or 1)
+    - article_feedback: List of (response_array, score) pairs
     
     Returns:
     - Updated user embedding as a list of 11 floats
     """
-    # Find the current user
-    user_data = users_collection.find_one({"username": user_name})
-    persona_index_value = persona_index.get(user_data.get("persona", None), 3)
+    # The persona only picks the negative-feedback centroid; the cached profile is enough
+    user_data = get_user_profile(user_name)
     if not user_data:
         st.error(f"User {user_name} not found.")
         return None
+    if not article_feedback:
+        return user_data.get('user_embedding', None)
+    persona_index_value = persona_index.get(user_data.get("persona", None), 3)
+    
+    pipeline = embedding_update_pipeline(
+        [decode_vector(article_response_array) for article_response_array, _ in article_feedback],
+        [feedback_score for _, feedback_score in article_feedback],
+        initial_centroids[persona_index_value],
+        np.random.default_rng()
+    )
+    updated = users_collection.find_one_and_update(
+        {"username": user_name},
+        pipeline,
+        projection={"_id": 0, "user_embedding": 1, "feedback_count": 1},
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+    if updated is None:
+        st.error(f"User {user_name} not found.")
+        return None
+    
+    # Keep the cached profile in step with the document
+    patch_user_profile(user_name, updated)
+    # Cached rankings were computed from the old embedding
+    get_candidate_cache().invalidate_user(user_name)
+    
+    return updated["user_embedding"]
+
+# --- Random Sampling ---
+# Articles carry an indexed uniform random key `rand` (scripts/backfill_random_keys.py);
+# [RANDOM_SAMPLING] stratify_by optionally spreads draws evenly over a field such as category.
+RANDOM_SAMPLING_CONFIG = st.secrets.get("RANDOM_SAMPLING", {})
+
+def random_key_range(query, count, skip):
+    """
+    Read `count` articles in `rand` order starting from a random pivot,
+    wrapping around to the start of the key range if the pivot is near 1.
+    
+    Args:
+    - query (dict): Extra filter, e.g. one stratum
+    - count (int): Number of articles wanted
+    - skip (SeenArticleSet): Articles to skip client-side (rated, shown or pooled);
+      the articles drawn are added to it
+    
+    Returns:
+    - List of up to `count` articles
+    """
+    pivot = random.random()
+    found = []
+    for key_range in ({"$gte": pivot}, {"$lt": pivot}):
+        # No limit: skipped articles are read past in small batches until enough are found
+        cursor = top_stories.find({**query, "rand": key_range}, CARD_PROJECTION).sort("rand", 1).batch_size(2 * count)
+        found.extend(skip.take_unseen(cursor, limit=count - len(found)))
+        if len(found) >= count:
+            break
+    for article in found:
+        skip.add(article["_id"])
+    return found
+
+def stratum_quotas(strata, size):
+    """
+    Split `size` draws evenly over the strata; the remainder goes to randomly chosen strata.
+    
+    Args:
+    - strata (list): Values of the stratification field
+    - size (int): Number of articles to draw
+    
+    Returns:
+    - List of (stratum, count) pairs with count > 0
+    """
+    base, remainder = divmod(size, len(strata))
+    extra = set(random.sample(range(len(strata)), remainder))
+    return [(value, base + (index in extra)) for index, value in enumerate(strata) if base + (index in extra)]
+
+def sample_random_articles(size, seen_articles, strata=None, exclude_ids=()):
+    """
+    Draw random articles through the indexed `rand` key instead of $sample.
     
-    # Get the current user embedding or initialize if not exists
-    current_embedding = user_data.get('user_embedding', None)
+    Uses no Streamlit calls, so it can also run on the prefetch workers.
+    Articles that have no `rand` key yet are only reached by the $sample top-up
+    used when the keyed draw comes back short. Rated and excluded articles are
+    skipped client-side, so the queries do not grow with them.
     
-    # Get the current number of feedback submissions
-    feedback_count = user_data.get('feedback_count', 0)
+    Args:
+    - size (int): Number of articles to draw
+    - seen_articles (SeenArticleSet): Articles the user already rated
+    - strata (list, optional): Values of RANDOM_SAMPLING stratify_by to draw evenly from
+    - exclude_ids (iterable): Article _ids to leave out, e.g. those already shown
     
-    # Calculate new embedding based on feedback score
-    if current_embedding is None:
-        # First feedback submission
-        new_embedding = article_response_array
-        feedback_count = 1
+    Returns:
+    - List of up to `size` distinct articles in random order
+    """
+    skip = seen_articles.union(exclude_ids)
+    stratify_by = RANDOM_SAMPLING_CONFIG.get("stratify_by")
+    if stratify_by and strata:
+        queries = [({stratify_by: value}, count) for value, count in stratum_quotas(strata, size)]
     else:
-        if feedback_score == -1:
-            new_embedding = update_negative_embedding_combined(current_embedding=current_embedding, article_response_array=article_response_array, global_embedding_centroid=initial_centroids[persona_index_value])
-            print("Negative feedback received. Updated embedding:", new_embedding)
-            feedback_count += 1
-        elif feedback_score == 1:
-            # Positive feedback: double the weight
-            new_embedding = [
-                ((current_embedding[i] * feedback_count) + (article_response_array[i] * 2)) 
-                / (feedback_count + 2)
-                for i in range(len(current_embedding))
-            ]
-            feedback_count += 2
-        else:  # feedback_score == 0
-            # Neutral feedback: standard update method
-            new_embedding = [
-                ((current_embedding[i] * feedback_count) + article_response_array[i]) 
-                / (feedback_count + 1)
-                for i in range(len(current_embedding))
-            ]
-            feedback_count += 1
-    
-    # Update user document
-    users_collection.update_one(
-        {"username": user_name},
-        {
-            "$set": {
-                "user_embedding": new_embedding,
-                "feedback_count": feedback_count
-            }
-        }
-    )
+        queries = []
+    # Unstratified draw; with strata it tops up strata too small for their quota
+    queries.append(({}, size))
     
-    return new_embedding
+    articles = []
+    for query, count in queries:
+        count = min(count, size - len(articles))
+        if count > 0:
+            articles.extend(random_key_range(query, count, skip))
+    
+    # Not enough keyed articles (e.g. before the backfill); fall back to $sample,
+    # drawing extra to make up for skipped ones and retrying a few times
+    for _ in range(3):
+        missing = size - len(articles)
+        if missing <= 0:
+            break
+        for article in skip.filter_unseen(top_stories.aggregate([
+            {"$sample": {"size": 2 * missing}},
+            {"$project": CARD_PROJECTION}
+        ])):
+            if len(articles) < size and article["_id"] not in skip:
+                articles.append(article)
+                skip.add(article["_id"])
+    random.shuffle(articles)
+    return articles
 
-def load_random_articles(limit=5):
-    try:
+@st.cache_data(ttl=3600)
+def get_random_strata(field):
+    """Distinct values of the stratification field, refreshed hourly"""
+    return [value for value in top_stories.distinct(field) if value is not None]
 
-        random_articles = list(top_stories.aggregate([{"$sample": {"size": limit}}]))
-        return random_articles
+def load_random_articles(limit=5, user_name=None, exclude_ids=()):
+    """
+    Load random articles, skipping ones the user already rated and `exclude_ids`.
+    
+    Args:
+    - limit (int): Number of articles to retrieve
+    - user_name (str, optional): User whose rated articles are skipped
+    - exclude_ids (iterable): Article _ids to leave out
+    
+    Returns:
+    - List of articles
+    """
+    try:
+        return sample_random_articles(limit, *random_sampling_inputs(user_name), exclude_ids=exclude_ids)
     except Exception as e:
         st.error(f"Error loading random articles from MongoDB: {e}")
         return []
 
+def prefetch_random_articles(limit, user_name=None, exclude_ids=()):
+    """Start drawing random articles on a prefetch worker and return the Future"""
+    seen_articles, strata = random_sampling_inputs(user_name)
+    return get_prefetch_executor().submit(sample_random_articles, limit, seen_articles, strata, list(exclude_ids))
+
+def random_sampling_inputs(user_name):
+    """Session-dependent inputs of sample_random_articles: (seen articles, strata)"""
+    seen_articles = get_seen_articles(user_name) if user_name else SeenArticleSet()
+    stratify_by = RANDOM_SAMPLING_CONFIG.get("stratify_by")
+    return seen_articles, get_random_strata(stratify_by) if stratify_by else None
+
 # def load_latest_articles(limit=5):
 #     try:
 #         # Get the top_stories collection
@@ -386,17 +798,17 @@ def load_random_articles(limit=5):
     
 
 # article loading function
-def load_latest_articles(user_name=None, limit=5):
+def load_latest_articles(user_name=None, limit=5, after=None):
     if user_name:
         # Use the new function that excludes previously rated articles
-        return load_latest_articles_excluding_feedback(user_name, limit)
+        return load_latest_articles_excluding_feedback(user_name, limit, after)
     else:
         try:
-            # Get the top_stories collection
-            top_stories = db["top_stories"]
             # Query articles sorted by published date in descending order (newest first)
             latest_articles = list(
-                top_stories.find().sort("published", -1).limit(limit)
+                top_stories.find(keyset_match(after, "published"), CARD_PROJECTION)
+                .sort([("published", -1), ("_id", -1)])
+                .limit(limit)
             )
             return latest_articles
         except Exception as e:
@@ -414,15 +826,16 @@ def load_latest_articles(user_name=None, limit=5):
 #         st.error(f"Error loading articles from MongoDB: {e}")
 #         return []
 
-def load_articles_from_mongodb(user_name=None, offset=0, limit=5, collection=None):
+def load_articles_from_mongodb(user_name=None, offset=0, limit=5, collection=None, after=None):
     """
     Load articles from a MongoDB collection, optionally excluding previously rated articles.
     
     Args:
     - user_name (str, optional): Username to filter out previously rated articles
-    - offset (int): Number of documents to skip
+    - offset (int): Number of documents to skip (ignored when `after` is given)
     - limit (int): Number of documents to retrieve
     - collection (MongoDB collection, optional): Collection to query
+    - after (dict, optional): Page token from page_token; resumes after that _id
     
     Returns:
     - List of articles
@@ -430,18 +843,22 @@ def load_articles_from_mongodb(user_name=None, offset=0, limit=5, collection=Non
     try:
         # If no collection is provided, default to "Critical Thinker"
         if collection is None:
-            collection = db["Critical Thinker"]
+            collection = CollectionHandle("Critical Thinker")
+        
+        # Page in _id order, seeking past the token instead of skipping
+        query = keyset_match(after, descending=False)
+        if after:
+            offset = 0
         
         # If a username is provided, exclude articles already rated
         if user_name:
-            # Get IDs of articles user has already provided feedback on
-            feedback_article_ids = get_user_feedback_article_ids(user_name)
+            # Articles user has already provided feedback on
+            seen_articles = get_seen_articles(user_name)
             
-            # Construct a query to exclude these articles
-            query = {"_id": {"$nin": [ObjectId(article_id) for article_id in feedback_article_ids]}}
-            print(query)
-            # Retrieve new articles
-            articles = list(collection.find(query).skip(offset).limit(limit))
+            # Retrieve new articles, skipping rated ones as the cursor is read; reading
+            # stops once enough are found
+            cursor = collection.find(query, CARD_PROJECTION).sort("_id", 1).batch_size(offset + 2 * limit)
+            articles = seen_articles.take_unseen(cursor, offset=offset, limit=limit)
             
             # # If not enough articles, fill with additional articles
             # if len(articles) < limit:
@@ -464,13 +881,92 @@ def load_articles_from_mongodb(user_name=None, offset=0, limit=5, collection=Non
             return articles
         else:
             # If no username, just return articles normally
-            articles = list(collection.find().skip(offset).limit(limit))
+            articles = list(collection.find(query, CARD_PROJECTION).sort("_id", 1).skip(offset).limit(limit))
             return articles
     
     except Exception as e:
         st.error(f"Error loading articles from MongoDB: {e}")
         return []
     
+def popularity_updates(rankings):
+    """
+    Build the $inc updates that fold ranking documents into article_popularity.
+    
+    Args:
+    - rankings (list): Ranking documents with article_id, title, rank and page
+    
+    Returns:
+    - List of UpdateOne operations, one per article
+    """
+    totals = {}
+    for ranking in rankings:
+        article_id = ranking.get("article_id")
+        if not article_id or not ObjectId.is_valid(article_id):
+            continue
+        rank = ranking.get("rank") or 0
+        page = ranking.get("page", "unknown")
+        entry = totals.setdefault(article_id, {"title": ranking.get("title"), "inc": {}})
+        for field, value in (
+            ("total_score", rank),
+            ("count", 1),
+            (f"pages.{page}.total_score", rank),
+            (f"pages.{page}.count", 1)
+        ):
+            entry["inc"][field] = entry["inc"].get(field, 0) + value
+    
+    return [
+        pymongo.UpdateOne(
+            {"_id": ObjectId(article_id)},
+            {"$inc": entry["inc"], "$set": {"title": entry["title"], "updated_at": datetime.now()}},
+            upsert=True
+        )
+        for article_id, entry in totals.items()
+    ]
+
+def apply_popularity_updates(rankings):
+    updates = popularity_updates(rankings)
+    if updates:
+        article_popularity_collection.bulk_write(updates, ordered=False)
+
+@st.cache_resource
+def get_write_queue():
+    """
+    Process-wide write-behind queue for highlight, satisfaction and ranking events.
+    Settings come from the optional [WRITE_BEHIND] section of st.secrets.
+    """
+    config = st.secrets.get("WRITE_BEHIND", {})
+    return WriteBehindQueue(
+        batch_size=config.get("batch_size", 100),
+        flush_interval=config.get("flush_interval", 0.5),
+        max_retries=config.get("max_retries", 5),
+        max_queue_size=config.get("max_queue_size", 10000),
+        put_timeout=config.get("put_timeout", 5.0),
+        # Popularity totals follow the rankings once they are written
+        on_flush={rankings_collection.name: apply_popularity_updates}
+    )
+
+def queue_insert(collection, document):
+    """
+    Queue an append-only event document for insertion without waiting on the database.
+    
+    Args:
+    - collection (CollectionHandle): Collection to insert into
+    - document (dict): Document to insert
+    """
+    get_write_queue().put(collection, document)
+
+def insert_rankings(rankings):
+    """
+    Queue a submission's ranking documents; article popularity totals are
+    updated when the batch is written.
+    
+    Args:
+    - rankings (list): Ranking documents to insert
+    """
+    if not rankings:
+        return
+    get_write_queue().put_many(rankings_collection, rankings)
+
 # --- Common CSS Styles ---
 def load_css():
     st.markdown("""
@@ -524,6 +1020,10 @@ def main():
     st.set_page_config(page_title="Login", layout="wide")
     st.title("Read My Sources")
     load_css()
+    try:
+        ensure_app_indexes()
+    except Exception as e:
+        st.error(f"Error creating indexes: {e}")
     user_name = st.text_input("Enter your username:", value=st.session_state.user_name)
     # Create two columns
     col1, col2 = st.columns(2)
@@ -557,21 +1057,37 @@ def main():
             
     # Admin panel for user management
     with st.expander("Admin Panel"):
+        try:
+            for entry in index_problems(ensure_app_indexes()):
+                st.error(f"Index {entry['collection']}.{entry['index']} is not in place ({entry['status']}). Fix the data and use Check Indexes to retry.")
+                if entry["index"] == FEEDBACK_UNIQUE_INDEX:
+                    st.write("Remove duplicate feedback rows with `python scripts/dedupe_feedback.py` (newest kept).")
+                if entry["index"] == USERNAME_UNIQUE_INDEX:
+                    st.write("Usernames held by more than one user:")
+                    st.dataframe(pd.DataFrame(duplicate_usernames(users_collection)))
+        except Exception as e:
+            st.error(f"Error creating indexes: {e}")
+        
         st.write("Add a new user to the system:")
         new_username = st.text_input("New username:")
         if st.button("Add User"):
             if new_username:
-                # Check if the user already exists
-                existing_user = users_collection.find_one({"username": new_username})
-                if existing_user:
-                    st.error(f"Username '{new_username}' already exists!")
-                else:
-                    # Add the new user to the MongoDB collection without a persona
-                    users_collection.insert_one({
-                        "username": new_username, 
-                        "created_at": pd.Timestamp.now()
-                    })
+                # Add the user without a persona in one upsert, so a concurrent add
+                # cannot slip in between a lookup and the insert
+                try:
+                    result = users_collection.update_one(
+                        {"username": new_username},
+                        {"$setOnInsert": {"created_at": pd.Timestamp.now()}},
+                        upsert=True
+                    )
+                    created = result.upserted_id is not None
+                except pymongo.errors.DuplicateKeyError:
+                    # A concurrent upsert won the race against the unique username index
+                    created = False
+                if created:
                     st.success(f"User '{new_username}' added successfully! The user will need to complete initialization.")
+                else:
+                    st.error(f"Username '{new_username}' already exists!")
             else:
                 st.error("Please enter a username.")
         
@@ -586,6 +1102,44 @@ def main():
         except Exception as e:
             st.error(f"Error loading users: {e}")
         
+        st.write("Write-behind queue:")
+        st.json(get_write_queue().stats())
+        
+        query_stats = get_query_stats()
+        if query_stats is not None:
+            st.write("Query statistics (slowest total time first):")
+            summary = query_stats.summary()
+            if summary:
+                st.dataframe(pd.DataFrame(summary))
+                st.write("Command duration histogram:")
+                st.dataframe(pd.DataFrame(list(query_stats.histogram().items()), columns=["duration", "commands"]), hide_index=True)
+                st.write(f"Slowest {query_stats.slowest_count} commands:")
+                st.dataframe(pd.DataFrame(query_stats.slowest()))
+            else:
+                st.info("No commands recorded yet.")
+            if st.button("Reset Query Statistics"):
+                query_stats.reset()
+                st.rerun()
+        
+        if st.button("Check Indexes"):
+            try:
+                st.write("Required indexes:")
+                report = ensure_indexes(get_database(), RANDOM_SAMPLING_CONFIG.get("stratify_by"))
+                st.dataframe(pd.DataFrame(report))
+                for entry in index_problems(report):
+                    st.error(f"Index {entry['collection']}.{entry['index']} is not in place ({entry['status']})")
+                if not index_problems(report):
+                    # Drop the cached startup report so its error at the top of the panel clears
+                    ensure_app_indexes.clear()
+                plans = explain_page_queries(get_database())
+                st.write("Page query plans:")
+                st.dataframe(pd.DataFrame(plans))
+                for plan in plans:
+                    if plan["collscan"]:
+                        st.warning(f"{plan['page']}: '{plan['query']}' on {plan['collection']} scans the whole collection")
+            except Exception as e:
+                st.error(f"Error checking indexes: {e}")
+        
         st.write("Delete a user:")
         delete_username = st.text_input("Enter username to delete:")
         if st.button("Delete User"):
@@ -594,6 +1148,7 @@ def main():
                 existing_user = users_collection.find_one({"username": delete_username})
                 if existing_user:
                     users_collection.delete_one({"username": delete_username})
+                    invalidate_user_profile(delete_username)
                     st.success(f"User '{delete_username}' deleted successfully!")
                 else:
                     st.error(f"Username '{delete_username}' does not exist!")
@@ -0,0 +1,69 @@
+"""
+Timing for building a page of 20 article cards.
+
+Compares the previous path (full BeautifulSoup parse of every summary), the
+streaming prefix stripper and rendering from precomputed display fields.
+
+Run from the repository root:
+    python benchmarks/bench_card_rendering.py
+"""
+import os
+import random
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cards
+from cards import display_fields, render_article_card
+
+PAGE_SIZE = 20
+
+
+def make_article(index, rng):
+    paragraphs = "".join(
+        f"<p>{' '.join(rng.choice(['startup', 'funding', 'AI', '&amp;', 'round', 'series', 'model']) for _ in range(60))}</p>"
+        for _ in range(rng.randint(10, 40))
+    )
+    return {
+        "_id": f"article-{index}",
+        "title": f"Article {index}",
+        "summary": f"<div class='body'>{paragraphs}<p>&copy; 2025 TechCrunch. All rights reserved.</p></div>",
+        "link": f"https://example.com/{index}",
+        "published": "2025-03-01",
+        "authors": ["Jane Doe", "John Roe"],
+        "duration": "4 min"
+    }
+
+def bs4_prefix(raw_html, limit):
+    """Previous behaviour: parse the whole summary, then slice"""
+    return BeautifulSoup(raw_html, "html.parser").get_text()[:limit]
+
+def time_page(articles, number=20):
+    return min(timeit.repeat(lambda: [render_article_card(a) for a in articles], number=number, repeat=5)) / number * 1000
+
+def main():
+    rng = random.Random(0)
+    articles = [make_article(i, rng) for i in range(PAGE_SIZE)]
+    average_size = sum(len(a["summary"]) for a in articles) / len(articles)
+    print(f"{PAGE_SIZE} cards, average summary {average_size / 1024:.1f} KiB")
+
+    streaming = cards.visible_text_prefix
+    cards.visible_text_prefix = bs4_prefix
+    before = [render_article_card(a) for a in articles]
+    before_ms = time_page(articles)
+    cards.visible_text_prefix = streaming
+    after = [render_article_card(a) for a in articles]
+    after_ms = time_page(articles)
+    assert before == after, "streaming stripper changed card output"
+
+    precomputed_ms = time_page([{**a, **display_fields(a)} for a in articles])
+
+    print(f"{'full BeautifulSoup parse':<28}{before_ms:>10.2f} ms/page")
+    print(f"{'streaming prefix stripper':<28}{after_ms:>10.2f} ms/page  ({before_ms / after_ms:.0f}x)")
+    print(f"{'precomputed display fields':<28}{precomputed_ms:>10.2f} ms/page  ({before_ms / precomputed_ms:.0f}x)")
+
+if __name__ == "__main__":
+    main()
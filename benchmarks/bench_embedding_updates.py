@@ -0,0 +1,109 @@
+"""
+Server-side embedding updates (embedding_math.embedding_update_pipeline) vs the
+previous update, which read the user, folded the scores in NumPy
+(embedding_math.fold_embedding_feedback) and wrote the embedding back.
+
+Scratch users with and without an existing embedding receive random
+20-article submissions both ways, in two collections of the given database
+(dropped afterwards). The resulting embeddings and feedback counts are compared
+(negative-score perturbations come from identically seeded generators) and the
+per-submission latency of each path is reported. The script exits non-zero if
+any result differs by more than --tolerance; the fold works in float32, so the
+default allows for its rounding.
+
+A MongoDB server (4.2+, for pipeline updates) is required.
+
+Run from the repository root:
+    python benchmarks/bench_embedding_updates.py [--uri URI] [--database NAME] [--submissions N]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pymongo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_math import embedding_update_pipeline, fold_embedding_feedback
+
+SUBMISSION_SIZE = 20
+
+
+def read_fold_write(collection, user_id, feedback, centroid, rng):
+    user = collection.find_one({"_id": user_id})
+    vectors, scores = [vector for vector, _ in feedback], [score for _, score in feedback]
+    if user.get("user_embedding") is None and scores[0] == -1:
+        # The pipeline also draws a perturbation for a negative first article it then ignores
+        rng.normal(loc=0.0, scale=0.3, size=len(vectors[0]))
+    embedding, count = fold_embedding_feedback(user.get("user_embedding"), user.get("feedback_count", 0), vectors, scores, centroid, rng)
+    collection.update_one({"_id": user_id}, {"$set": {"user_embedding": embedding.tolist(), "feedback_count": count}})
+
+def pipeline_update(collection, user_id, feedback, centroid, rng):
+    pipeline = embedding_update_pipeline([vector for vector, _ in feedback], [score for _, score in feedback], centroid, rng)
+    collection.find_one_and_update(
+        {"_id": user_id}, pipeline,
+        projection={"_id": 0, "user_embedding": 1, "feedback_count": 1},
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+
+
+def run(database, dim, submissions, rng):
+    """Apply the same submissions both ways; return (max difference, reference ms, pipeline ms)"""
+    collections = {name: database[f"bench_embedding_{name}"] for name in ("reference", "pipeline")}
+    starts = [rng.uniform(1, 4, dim).tolist() if index % 4 else None for index in range(submissions)]
+    for collection in collections.values():
+        collection.drop()
+        collection.insert_many([
+            {"_id": index, "user_embedding": start, "feedback_count": 10} if start else {"_id": index}
+            for index, start in enumerate(starts)
+        ])
+    centroid = rng.uniform(1, 4, dim).tolist()
+    batches = [
+        list(zip(rng.uniform(1, 4, (SUBMISSION_SIZE, dim)).tolist(), rng.integers(-1, 2, SUBMISSION_SIZE).tolist()))
+        for _ in range(submissions)
+    ]
+    seeds = rng.integers(0, 2**32, submissions)
+
+    timings = {}
+    for name, update in (("reference", read_fold_write), ("pipeline", pipeline_update)):
+        started = time.perf_counter()
+        for user_id, (feedback, seed) in enumerate(zip(batches, seeds)):
+            update(collections[name], user_id, feedback, centroid, np.random.default_rng(seed))
+        timings[name] = (time.perf_counter() - started) / submissions * 1e3
+
+    worst = 0.0
+    for expected in collections["reference"].find():
+        actual = collections["pipeline"].find_one({"_id": expected["_id"]})
+        if actual["feedback_count"] != expected["feedback_count"]:
+            worst = math.inf
+        worst = max(worst, float(np.max(np.abs(np.subtract(actual["user_embedding"], expected["user_embedding"])))))
+    for collection in collections.values():
+        collection.drop()
+    return worst, timings["reference"], timings["pipeline"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="techcrunch_bench")
+    parser.add_argument("--submissions", type=int, default=200, help="Submissions per dimension, one scratch user each")
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    database = pymongo.MongoClient(args.uri)[args.database]
+    rng = np.random.default_rng(0)
+    print(f"{'dim':>5}{'max difference':>16}{'read+fold+write ms':>20}{'pipeline ms':>13}")
+    failed = False
+    for dim in (11, 384, 768):
+        worst, reference_ms, pipeline_ms = run(database, dim, args.submissions, rng)
+        failed |= not worst <= args.tolerance
+        print(f"{dim:>5}{worst:>16.2e}{reference_ms:>20.2f}{pipeline_ms:>13.2f}")
+    if failed:
+        sys.exit(f"The pipeline update differs from the previous update by more than {args.tolerance}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Per-page render benchmark for Login.py and every page under pages/, driven
+through Streamlit's AppTest.
+
+Seeds a MongoDB database (techcrunch_bench by default, dropped first) with
+synthetic articles, users, popularity totals and category data, then reruns
+each scenario --runs times. For every measured rerun it records wall time and,
+through a pymongo CommandListener, the number of commands and the BSON bytes
+sent and received. Writes that the write-behind queue flushes after the rerun
+returns are reported separately as deferred commands.
+
+A real MongoDB server is required (a local mongod is enough): in-memory
+stand-ins do not implement the aggregation operators and bulk write API the
+pages use, and cannot report bytes on the wire. Curated articles use the numpy
+vector search backend, so Atlas Search is not needed.
+
+Run from the repository root:
+    python benchmarks/bench_pages.py [--uri URI] [--database NAME] [--runs N] [--articles N] [--output FILE]
+
+To compare bytes on the wire before and after a change, save a report with
+--output at the old revision and pass it as --baseline at the new one; the
+per-scenario bytes_received medians are printed side by side.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import bson
+import numpy as np
+import pymongo
+from pymongo import monitoring
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cards import display_fields
+
+BENCH_USER = "bench_user"
+NEW_USER = "bench_new_user"  # Not initialized yet, so the Initialization page renders its form
+WORDS = ["startup", "funding", "AI", "&amp;", "round", "series", "model", "chip", "cloud", "policy"]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands and BSON bytes in each direction for every client in the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.commands = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.by_name = Counter()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "commands": self.commands,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "by_name": dict(self.by_name)
+            }
+
+    def started(self, event):
+        size = len(bson.encode(event.command))
+        with self._lock:
+            self.commands += 1
+            self.bytes_sent += size
+            self.by_name[event.command_name] += 1
+
+    def succeeded(self, event):
+        size = len(bson.encode(event.reply))
+        with self._lock:
+            self.bytes_received += size
+
+    def failed(self, event):
+        pass
+
+
+def seed(database, articles, rng, precompute_display=False):
+    """Replace the benchmark database contents with synthetic data"""
+    for name in ("top_stories", "users", "rankings", "article_popularity", "user_article_feedback",
+                 "highlight_feedback", "satisfaction", "new_init"):
+        database[name].drop()
+
+    now = datetime.now()
+    stories = []
+    for index in range(articles):
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(WORDS, size=60))}</p>" for _ in range(rng.integers(10, 40))
+        )
+        stories.append({
+            "title": f"Benchmark article {index}",
+            "summary": f"<div class='body'>{paragraphs}<p>&copy; 2025 TechCrunch. All rights reserved.</p></div>",
+            "link": f"https://example.com/articles/{index}",
+            # A tenth of the articles are from today so the default single-day filter has results
+            "published": now - timedelta(hours=float(rng.uniform(0, 12 if index % 10 == 0 else 24 * 30))),
+            "authors": ["Jane Doe", "John Roe"],
+            "duration": f"{rng.integers(2, 12)} min",
+            "highlights": [f"Highlight {n} of article {index}: {' '.join(rng.choice(WORDS, size=30))}" for n in range(3)],
+            "response_array": rng.uniform(1, 4, size=11).round(2).tolist()
+        })
+        if precompute_display:
+            stories[-1].update(display_fields(stories[-1]))
+    article_ids = database.top_stories.insert_many(stories).inserted_ids
+
+    database.users.insert_many([
+        {
+            "username": BENCH_USER,
+            "persona": "Critical Thinker",
+            "user_interests": {"categories": ["Technology"]},
+            "user_embedding": rng.uniform(1, 4, size=11).tolist(),
+            "feedback_count": 10,  # Enough feedback for the vector search path
+            "created_at": now
+        },
+        {"username": NEW_USER, "created_at": now}
+    ])
+
+    database.new_init.insert_one({
+        category: {subcategory: ["TechCrunch", "The Verge"] for subcategory in subcategories}
+        for category, subcategories in {
+            "Technology": ["AI", "Hardware", "Security"],
+            "Business": ["Startups", "Venture", "Markets"],
+            "Science": ["Space", "Climate"]
+        }.items()
+    })
+
+    popular = rng.choice(len(article_ids), size=min(200, len(article_ids)), replace=False)
+    database.article_popularity.insert_many([
+        {
+            "_id": article_ids[index],
+            "title": stories[index]["title"],
+            "total_score": int(rng.integers(1, 500)),
+            "count": int(rng.integers(1, 50)),
+            "updated_at": now
+        }
+        for index in popular
+    ])
+    database.article_popularity.create_index([("total_score", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)])
+
+    seen = rng.choice(len(article_ids), size=min(20, len(article_ids)), replace=False)
+    database.user_article_feedback.insert_many([
+        {"user_name": BENCH_USER, "article_id": str(article_ids[index]), "feedback_type": "article_score", "timestamp": now}
+        for index in seen
+    ])
+
+
+def click(label=None, key_prefix=None):
+    """Scenario action: click the first button matching a label or key prefix"""
+    def action(at):
+        for button in at.button:
+            if (label is not None and button.label == label) or (key_prefix is not None and (button.key or "").startswith(key_prefix)):
+                button.click()
+                return
+        raise LookupError(f"No button with label {label!r} / key prefix {key_prefix!r}")
+    return action
+
+def login(at):
+    next(text_input for text_input in at.text_input if text_input.label == "Enter your username:").input(BENCH_USER)
+    click("Login")(at)
+
+
+LOGGED_IN = {"user_name": BENCH_USER, "is_valid_user": True}
+
+# (script, scenario, session state, action); the action runs between the
+# unmeasured first load and the measured rerun, None measures the first load
+SCENARIOS = [
+    ("Login.py", "first_load", {}, None),
+    ("Login.py", "login", {}, login),
+    ("pages/01_Initialization.py", "first_load", {"user_name": NEW_USER, "is_valid_user": True}, None),
+    ("pages/01_Initialization.py", "expand_category", {"user_name": NEW_USER, "is_valid_user": True}, click(key_prefix="btn_")),
+    ("pages/02_Curated_Articles.py", "first_load", LOGGED_IN, None),
+    ("pages/02_Curated_Articles.py", "load_more", LOGGED_IN, click("Load More")),
+    ("pages/02_Curated_Articles.py", "refresh", LOGGED_IN, click("Refresh Curated Articles")),
+    ("pages/02_Curated_Articles.py", "next_highlight", LOGGED_IN, click(key_prefix="curated_next_highlight_")),
+    ("pages/02_Curated_Articles.py", "submit_highlight", LOGGED_IN, click(key_prefix="curated_submit_highlight_")),
+    ("pages/02_Curated_Articles.py", "submit", LOGGED_IN, click("Submit Article Scores and Rankings")),
+    ("pages/02_Curated_Articles.py", "submit_satisfaction", LOGGED_IN, click(key_prefix="curated_satisfaction_button")),
+    ("pages/03_Latest_News.py", "first_load", LOGGED_IN, None),
+    ("pages/03_Latest_News.py", "load_more", LOGGED_IN, click("Load More Articles")),
+    ("pages/03_Latest_News.py", "refresh", LOGGED_IN, click("Refresh Latest News")),
+    ("pages/03_Latest_News.py", "next_highlight", LOGGED_IN, click(key_prefix="next_highlight_")),
+    ("pages/03_Latest_News.py", "submit", LOGGED_IN, click("Submit Article Scores")),
+    ("pages/04_Popular.py", "first_load", LOGGED_IN, None),
+    ("pages/04_Popular.py", "refresh", LOGGED_IN, click("Refresh Popular News")),
+    ("pages/04_Popular.py", "submit_satisfaction", LOGGED_IN, click(key_prefix="popular_news_satisfaction_button")),
+    ("pages/05_Random_Articles.py", "first_load", LOGGED_IN, None),
+    ("pages/05_Random_Articles.py", "refresh", LOGGED_IN, click("Load New Random Articles")),
+    ("pages/05_Random_Articles.py", "next_highlight", LOGGED_IN, click(key_prefix="random_next_highlight_")),
+    ("pages/05_Random_Articles.py", "submit", LOGGED_IN, click(key_prefix="random_articles_submit"))
+]
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=float)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "mean": round(float(values.mean()), 3),
+        "min": round(float(values.min()), 3),
+        "max": round(float(values.max()), 3)
+    }
+
+def run_scenario(script, session, action, args, secrets, counter):
+    """Rerun one scenario and return its per-rerun measurements"""
+    samples = []
+    for run in range(args.warmup + args.runs):
+        at = AppTest.from_file(os.path.join(ROOT, script), default_timeout=args.timeout)
+        for section, values in secrets.items():
+            at.secrets[section] = values
+        for key, value in session.items():
+            at.session_state[key] = value
+        if action is not None:
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            action(at)
+
+        counter.reset()
+        started = time.perf_counter()
+        at.run()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        foreground = counter.snapshot()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+        # Let the write-behind queue flush what this rerun enqueued
+        time.sleep(args.settle)
+        total = counter.snapshot()
+        if run >= args.warmup:
+            samples.append({
+                "wall_ms": elapsed_ms,
+                "commands": foreground["commands"],
+                "bytes_sent": foreground["bytes_sent"],
+                "bytes_received": foreground["bytes_received"],
+                "deferred_commands": total["commands"] - foreground["commands"],
+                "by_name": foreground["by_name"],
+                # st.error output means the page rendered a failure path, not the real one
+                "page_errors": [element.value for element in at.error]
+            })
+    return samples
+
+
+def print_comparison(baseline, results):
+    """Print bytes_received p50 per scenario against a report from an earlier run"""
+    before = {(entry["page"], entry["scenario"]): entry for entry in baseline["results"]}
+    print(f"\nbytes_received p50: {baseline.get('revision')} -> this run", file=sys.stderr)
+    for entry in results:
+        old = before.get((entry["page"], entry["scenario"]), {}).get("bytes_received")
+        new = entry.get("bytes_received")
+        if not old or not new:
+            continue
+        change = (new["p50"] - old["p50"]) / old["p50"] * 100 if old["p50"] else 0.0
+        print(f"{entry['page']:<32}{entry['scenario']:<22}{old['p50']:>12.0f}{new['p50']:>12.0f}{change:>+9.1f}%", file=sys.stderr)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="techcrunch_bench", help="Dropped and re-seeded on every run")
+    parser.add_argument("--runs", type=int, default=10, help="Measured reruns per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured reruns per scenario")
+    parser.add_argument("--articles", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30, help="AppTest timeout per rerun, in seconds")
+    parser.add_argument("--settle", type=float, default=0.3, help="Seconds to wait for write-behind flushes after each rerun")
+    parser.add_argument("--only", help="Only run scenarios whose script path contains this string")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--precompute-display", action="store_true",
+                        help="Seed articles with the display fields scripts/precompute_display_fields.py writes")
+    parser.add_argument("--baseline", help="Report from an earlier run to compare bytes_received against")
+    args = parser.parse_args()
+
+    # Registered before any client exists so the app's shared client reports to it
+    counter = CommandCounter()
+    monitoring.register(counter)
+
+    seed_client = pymongo.MongoClient(args.uri)
+    seed(seed_client[args.database], args.articles, np.random.default_rng(0), args.precompute_display)
+    seed_client.close()
+
+    secrets = {
+        "MONGO": {"uri": args.uri, "database": args.database},
+        "VECTOR_SEARCH": {"backend": "numpy"},
+        "WRITE_BEHIND": {"flush_interval": min(0.1, args.settle / 2)}
+    }
+    os.chdir(ROOT)  # Pages resolve relative paths from the repository root
+
+    results = []
+    for script, scenario, session, action in SCENARIOS:
+        if args.only and args.only not in script:
+            continue
+        entry = {"page": script, "scenario": scenario, "runs": args.runs}
+        try:
+            samples = run_scenario(script, session, action, args, secrets, counter)
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+        else:
+            for field in ("wall_ms", "commands", "bytes_sent", "bytes_received", "deferred_commands"):
+                entry[field] = summarize([sample[field] for sample in samples])
+            entry["commands_by_name"] = samples[-1]["by_name"]
+            page_errors = sorted({error for sample in samples for error in sample["page_errors"]})
+            if page_errors:
+                entry["page_errors"] = page_errors
+        print(f"{script:<32}{scenario:<22}{entry.get('wall_ms', {}).get('p50', entry.get('error'))}", file=sys.stderr)
+        results.append(entry)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "articles": args.articles,
+        "precompute_display": args.precompute_display,
+        "runs": args.runs,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
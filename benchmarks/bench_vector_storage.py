@@ -0,0 +1,112 @@
+"""
+Size and latency of response_array stored as a BSON array of doubles, a BSON
+float32 vector and packed float32 bytes (vector_codec).
+
+In-process, documents shaped like top_stories articles are BSON-encoded and
+decoded to compare document size and the time to turn a batch of documents into
+a vector matrix. With --uri the same corpus is also written to two collections
+of the given database (dropped afterwards) to compare collection sizes and the
+latency of loading every vector and of a 20-article listing query.
+
+Run from the repository root:
+    python benchmarks/bench_vector_storage.py [--articles N] [--uri mongodb://localhost:27017]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import bson
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_codec import decode_vector, encode_vector
+
+
+FORMATS = {
+    "array": lambda vector: vector.tolist(),
+    "vector": encode_vector,
+    "packed": lambda vector: encode_vector(vector, packed=True)
+}
+
+
+def make_articles(count, dim, rng, encode):
+    """Articles with text fields of typical length and a dim-element response_array"""
+    start = datetime(2025, 1, 1)
+    articles = []
+    for i in range(count):
+        vector = rng.uniform(1, 5, dim)
+        articles.append({
+            "_id": bson.ObjectId(),
+            "title": f"Article {i} " + "x" * 60,
+            "summary": "lorem ipsum " * 50,
+            "link": f"https://example.com/articles/{i}",
+            "published": start + timedelta(minutes=i),
+            "authors": [{"name": "Jane Doe"}, {"name": "John Roe"}],
+            "highlights": ["highlight " * 8] * 3,
+            "response_array": encode(vector)
+        })
+    return articles
+
+
+def best_of(statement, number=1):
+    """Best time in milliseconds over 5 repeats"""
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e3
+
+
+def in_process(count, rng):
+    print(f"{'dim':>5}{'format':>8}{'doc bytes':>11}{'vector bytes':>14}{'decode+matrix ms':>18}")
+    for dim in (11, 384, 768):
+        for name, encode in FORMATS.items():
+            articles = make_articles(count, dim, rng, encode)
+            encoded = [bson.encode(article) for article in articles]
+            vector_bytes = len(bson.encode({"v": articles[0]["response_array"]})) - len(bson.encode({"v": None}))
+            decode = lambda: np.stack([decode_vector(bson.decode(raw)["response_array"]) for raw in encoded])
+            print(f"{dim:>5}{name:>8}{np.mean([len(raw) for raw in encoded]):>11.0f}{vector_bytes:>14}{best_of(decode):>18.1f}")
+
+
+def against_server(uri, database_name, count, rng):
+    import pymongo
+
+    database = pymongo.MongoClient(uri)[database_name]
+    print(f"\n{'format':>8}{'collection MB':>15}{'avg doc':>9}{'load vectors ms':>17}{'listing ms':>12}")
+    for name, encode in FORMATS.items():
+        collection = database[f"bench_vectors_{name}"]
+        collection.drop()
+        articles = make_articles(count, 11, rng, encode)
+        for start in range(0, count, 5000):
+            collection.insert_many(articles[start:start + 5000])
+        stats = database.command("collStats", collection.name)
+
+        def load_vectors():
+            return np.stack([decode_vector(doc["response_array"]) for doc in collection.find({}, {"response_array": 1})])
+
+        def listing():
+            return list(collection.find().sort("published", -1).limit(20))
+
+        collection.create_index([("published", -1)])
+        load_vectors()  # Warm the cache
+        print(
+            f"{name:>8}{stats['size'] / 2**20:>15.1f}{stats['avgObjSize']:>9.0f}"
+            f"{best_of(load_vectors):>17.1f}{best_of(listing, 20):>12.2f}"
+        )
+        collection.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--articles", type=int, default=20_000)
+    parser.add_argument("--uri", help="Also compare stored collections on this MongoDB server")
+    parser.add_argument("--database", default="techcrunch_bench")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    in_process(args.articles, rng)
+    if args.uri:
+        against_server(args.uri, args.database, args.articles, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CandidateCache:
+    """
+    Thread-safe bounded LRU of ranked vector search candidates.
+
+    An entry holds the (article id, score) pairs of one deep retrieval, best
+    match first, keyed by (user, embedding version, date window). Pages are
+    cut from the list locally, so reruns and Load More do not repeat the
+    vector search. Entries expire after `ttl` seconds so newly ingested
+    articles are picked up, and are dropped early with invalidate_user when
+    the user's embedding is rewritten.
+    """
+
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, load):
+        """
+        Return the candidates for `key`, calling `load()` on a miss or expiry.
+
+        Args:
+        - key (tuple): (user, embedding version, ...) cache key
+        - load (callable): Runs the retrieval and returns (id, score) pairs
+
+        Returns:
+        - List of (article id, score) pairs, best match first
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Retrieve outside the lock so other sessions are not held up
+        candidates = load()
+        with self._lock:
+            self._entries[key] = (now, candidates)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return candidates
+
+    def invalidate_user(self, user_name):
+        """Drop every entry for a user, e.g. after their embedding changed"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_name]:
+                del self._entries[key]
+
+
+def candidate_page(candidates, after, limit, seen_articles):
+    """
+    Cut the next page from a ranked candidate list.
+
+    Args:
+    - candidates (list): (article id, score) pairs sorted by (score, id) descending
+    - after (dict, optional): page_token(article, "vector_score") of the last article shown
+    - limit (int): Number of candidates wanted
+    - seen_articles (SeenArticleSet): Articles to skip
+
+    Returns:
+    - Tuple of (up to `limit` (article id, score) pairs, whether more candidates follow)
+    """
+    start = 0
+    if after:
+        start = next((i + 1 for i, (article_id, _) in enumerate(candidates) if article_id == after["_id"]), None)
+        if start is None:
+            # Token from an earlier candidate list: resume at the first lower-ranked candidate
+            start = next(
+                (i for i, (article_id, score) in enumerate(candidates) if (score, article_id) < (after["vector_score"], after["_id"])),
+                len(candidates)
+            )
+
+    page = []
+    for position in range(start, len(candidates)):
+        if candidates[position][0] in seen_articles:
+            continue
+        if len(page) == limit:
+            return page, True
+        page.append(candidates[position])
+    return page, False
@@ -0,0 +1,205 @@
+from html.parser import HTMLParser
+
+# Visible characters of the summary shown on a card
+SNIPPET_LENGTH = 150
+# Characters of a highlight shown on a card
+HIGHLIGHT_LENGTH = 250
+# Bump when the precomputed display_* fields change shape or content
+DISPLAY_VERSION = 1
+
+
+def remove_footer_text(summary):
+    index = summary.find("©")
+    if index != -1:
+        return summary[:index].rstrip()  # Remove footer and trailing whitespace
+    return summary  # Return unchanged
+
+
+class _PrefixReached(Exception):
+    pass
+
+
+class _VisibleTextParser(HTMLParser):
+    """Collects text nodes (entities decoded) and stops once enough text is seen"""
+
+    def __init__(self, limit):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.parts = []
+        self.length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "template"):
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "template") and self._skip_depth:
+            self._skip_depth -= 1
+
+    def unknown_decl(self, data):
+        # BeautifulSoup keeps CDATA sections as text
+        if data.startswith("CDATA["):
+            self.handle_data(data[len("CDATA["):])
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self.parts.append(data)
+        self.length += len(data)
+        if self.length >= self.limit:
+            raise _PrefixReached
+
+
+def visible_text_prefix(raw_html, limit, chunk_size=512):
+    """
+    Return the first `limit` characters of the visible text of an HTML fragment.
+
+    Matches BeautifulSoup(raw_html, "html.parser").get_text()[:limit] (apart from
+    unterminated entities at the very end of the input), but the markup is fed in
+    chunks and parsing stops as soon as enough text is seen.
+
+    Args:
+    - raw_html (str): HTML fragment
+    - limit (int): Number of visible characters needed
+    - chunk_size (int): Characters fed to the parser at a time
+
+    Returns:
+    - Text prefix, shorter than `limit` only if the whole text is shorter
+    """
+    parser = _VisibleTextParser(limit)
+    try:
+        for start in range(0, len(raw_html), chunk_size):
+            parser.feed(raw_html[start:start + chunk_size])
+        parser.close()
+    except _PrefixReached:
+        pass
+    return "".join(parser.parts)[:limit]
+
+
+def summary_snippet(raw_content):
+    """Card text for a summary: first 150 visible characters, footer removed"""
+    # Only the first 151 visible characters are needed to truncate and detect overflow
+    cleaned = visible_text_prefix(raw_content, SNIPPET_LENGTH + 1)
+    # Create the truncated version (first 150 characters)
+    truncated = cleaned[:SNIPPET_LENGTH]
+    was_truncated = len(cleaned) > SNIPPET_LENGTH
+    
+    # Check if a footer appears in the truncated part
+    if "©" in truncated:
+        return remove_footer_text(truncated)
+    content = truncated.rstrip()
+    if was_truncated:
+        content += "..."
+    return content
+
+
+def authors_line(authors):
+    return ", ".join(authors) if authors else "No author information available"
+
+
+def truncate_highlight(highlight):
+    if len(highlight) > HIGHLIGHT_LENGTH:
+        return highlight[:HIGHLIGHT_LENGTH] + '...'
+    return highlight
+
+
+def card_highlights(article):
+    """Highlights as shown on the highlight card, preferring the precomputed ones"""
+    highlights = article.get("display_highlights")
+    if highlights is None:
+        highlights = article.get("highlights", [])
+        if not isinstance(highlights, list):
+            return []
+        highlights = [truncate_highlight(highlight) for highlight in highlights]
+    return highlights
+
+
+def display_fields(article):
+    """
+    Compute the display_* fields stored on a top_stories document.
+
+    Args:
+    - article (dict): Document with summary, authors and highlights
+
+    Returns:
+    - Dict of fields to $set on the document
+    """
+    highlights = article.get("highlights", [])
+    return {
+        "display_snippet": summary_snippet(str(article.get("summary", "No summary available"))),
+        "display_authors": authors_line(article.get("authors", [])),
+        "display_highlights": [truncate_highlight(h) for h in highlights] if isinstance(highlights, list) else [],
+        "display_version": DISPLAY_VERSION
+    }
+
+
+def _unless_precomputed(display_field, raw_field):
+    """Projection expression: raw_field only where display_field is missing or null"""
+    return {"$cond": [{"$eq": [{"$ifNull": [f"${display_field}", None]}, None]}, f"${raw_field}", "$$REMOVE"]}
+
+
+# Projection for every article listing query: the fields render_article_card,
+# card_highlights and score submission read. The raw summary, authors and
+# highlights are only sent for articles without precomputed display fields, and
+# the embedding is fetched separately when scores are submitted.
+CARD_PROJECTION = {
+    "title": 1,
+    "link": 1,
+    "published": 1,
+    "duration": 1,
+    "display_snippet": 1,
+    "display_authors": 1,
+    "display_highlights": 1,
+    "summary": _unless_precomputed("display_snippet", "summary"),
+    "authors": _unless_precomputed("display_authors", "authors"),
+    "highlights": _unless_precomputed("display_highlights", "highlights")
+}
+
+
+def render_article_card(article):
+    """Build the card HTML for an article"""
+    title = str(article.get("title", "Unknown Title"))
+    # Prefer the fields precomputed at ingest (see display_fields)
+    content = article.get("display_snippet")
+    if content is None:
+        content = summary_snippet(str(article.get("summary", "No summary available")))
+    
+    url = article.get("link", "#")
+    raw_published_date = article.get("published", None)
+    if raw_published_date:
+        formatted_date = raw_published_date
+    else:
+        formatted_date = "No publication date available"
+
+    authors_text = article.get("display_authors")
+    if authors_text is None:
+        authors_text = authors_line(article.get("authors", []))
+    duration = article.get("duration", None)
+    distance = article.get("distance", "N/A")
+    if distance == "N/A":
+        article_html = f"""
+            <a href="{url}" target="_blank">
+                <div class="article-card">
+                    <h3 style="font-size: 20px; font-weight: bold;">{title}</h3>
+                    <p style="font-size: 16px; color: inherit;">{content}</p>
+                    <p class="inline-info"><span>Published:</span> {formatted_date},</p>
+                    <p class="inline-info"><span>Author(s):</span> {authors_text},</p>
+                    <p class="inline-info"><span>Duration:</span> {duration}</p>
+                </div>
+            </a>
+        """
+    else:
+            article_html = f"""
+        <a href="{url}" target="_blank">
+            <div class="article-card">
+                <h3 style="font-size: 20px; font-weight: bold;">{title}</h3>
+                <p style="font-size: 16px; color: inherit;">{content}</p>
+                <p class="inline-info"><span>Published:</span> {formatted_date},</p>
+                <p class="inline-info"><span>Author(s):</span> {authors_text},</p>
+                <p class="inline-info"><span>Duration:</span> {duration},</p>
+                <p class="inline-info"><span>Distance:</span> {distance}</p>
+            </div>
+        </a>
+    """
+    return article_html
@@ -0,0 +1,92 @@
+import threading
+import time
+
+
+class CategoryTree:
+    """
+    Snapshot of the new_init category/subcategory/source document.
+
+    `tree` is the document as the Initialization page renders it: category to
+    either a dict of subcategory to sources, or a plain list of sources.
+    `selections` flattens it to the page's checkbox keys ("category|subcategory",
+    or "category|general" for plain lists), so saving preferences looks each
+    key up instead of walking the tree.
+    """
+
+    def __init__(self, document, version=None):
+        self.version = version
+        self.tree = {key: value for key, value in document.items() if key not in ("_id", "version")}
+        self.selections = {}
+        for category, subcategories in self.tree.items():
+            if isinstance(subcategories, dict):
+                for subcategory, sources in subcategories.items():
+                    # A subcategory named "general" is saved like a plain list: no subcategory entry
+                    label = f"{category}: {subcategory}" if subcategory != "general" else None
+                    self.selections[f"{category}|{subcategory}"] = (category, label, sources)
+            else:
+                self.selections[f"{category}|general"] = (category, None, subcategories)
+
+    def interests(self, selection_keys):
+        """
+        Build the user_interests document for a set of checked selections.
+
+        Args:
+        - selection_keys (iterable): Checkbox keys; keys no longer in the tree are skipped
+
+        Returns:
+        - Dict with categories, subcategories, sources, selection_keys and sources_by_selection
+        """
+        categories, subcategories, sources, sources_by_selection = {}, {}, {}, {}
+        for key in selection_keys:
+            if key not in self.selections:
+                continue
+            category, subcategory, selection_sources = self.selections[key]
+            categories[category] = None
+            if subcategory:
+                subcategories[subcategory] = None
+            sources.update(dict.fromkeys(selection_sources))
+            sources_by_selection[key] = selection_sources
+        return {
+            "categories": list(categories),
+            "subcategories": list(subcategories),
+            "sources": list(sources),
+            "selection_keys": list(sources_by_selection),
+            "sources_by_selection": sources_by_selection
+        }
+
+
+class CategoryTreeCache:
+    """
+    Process-wide cache of the category tree.
+
+    The tree is read once and reused by every session. After `ttl` seconds the
+    next reader checks the document's `version` field (a projected read of one
+    field); the full document is downloaded again only if the version changed,
+    or on every expiry when the document carries no version.
+    """
+
+    def __init__(self, collection, ttl=300):
+        self.collection = collection
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tree = None
+        self._checked = 0.0
+
+    def get(self):
+        """Return the current CategoryTree, reloading it if it changed"""
+        with self._lock:
+            if self._tree is not None and time.monotonic() - self._checked < self.ttl:
+                return self._tree
+            if self._tree is not None and self._tree.version is not None:
+                current = self.collection.find_one({}, {"version": 1}) or {}
+                if current.get("version") == self._tree.version:
+                    self._checked = time.monotonic()
+                    return self._tree
+            document = self.collection.find_one({}) or {}
+            self._tree = CategoryTree(document, document.get("version"))
+            self._checked = time.monotonic()
+            return self._tree
+
+    def invalidate(self):
+        with self._lock:
+            self._tree = None
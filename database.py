@@ -0,0 +1,97 @@
+import pymongo
+import streamlit as st
+
+from query_stats import QueryStats
+
+DATABASE_NAME = "techcrunch_db"
+
+
+@st.cache_resource
+def get_client():
+    """
+    Create the process-wide MongoClient on first use.
+
+    Streamlit reruns and every session share this client and its connection pool.
+    Pool and timeout settings come from the [MONGO] section of st.secrets:
+    max_pool_size, min_pool_size, server_selection_timeout_ms,
+    connect_timeout_ms, socket_timeout_ms and compressors.
+    """
+    config = st.secrets["MONGO"]
+    uri = config.get("uri")
+    if not uri:
+        st.error("MongoDB URI is not set in the environment variables.")
+        st.stop()  # Stop the app if MongoDB URI is missing
+    options = {
+        "maxPoolSize": config.get("max_pool_size", 50),
+        "minPoolSize": config.get("min_pool_size", 0),
+        "serverSelectionTimeoutMS": config.get("server_selection_timeout_ms", 5000),
+        "connectTimeoutMS": config.get("connect_timeout_ms", 5000),
+        "socketTimeoutMS": config.get("socket_timeout_ms", 20000),
+        "appname": "read-my-sources"
+    }
+    if config.get("compressors"):
+        # e.g. "zstd,snappy,zlib"; zstd and snappy need their optional packages
+        options["compressors"] = config.get("compressors")
+    query_stats = get_query_stats()
+    if query_stats is not None:
+        options["event_listeners"] = [query_stats]
+    return pymongo.MongoClient(uri, **options)
+
+
+@st.cache_resource
+def get_query_stats():
+    """
+    Process-wide command listener for the shared client, shown in the Admin Panel.
+
+    Configured by the optional [QUERY_STATS] section of st.secrets: enabled
+    (default off, so production pays nothing unless asked), slowest (number of
+    slow commands kept), count_reply_bytes (default off; re-encodes every
+    reply), jsonl_path, jsonl_max_bytes and jsonl_backups. Returns None when
+    disabled.
+    """
+    config = st.secrets.get("QUERY_STATS", {})
+    if not config.get("enabled", False):
+        return None
+    return QueryStats(
+        slowest=config.get("slowest", 20),
+        jsonl_path=config.get("jsonl_path"),
+        jsonl_max_bytes=config.get("jsonl_max_bytes", 50_000_000),
+        jsonl_backups=config.get("jsonl_backups", 3),
+        count_reply_bytes=config.get("count_reply_bytes", False)
+    )
+
+
+def get_database():
+    # [MONGO] database overrides the default, e.g. for a seeded benchmark database
+    return get_client()[st.secrets["MONGO"].get("database", DATABASE_NAME)]
+
+
+def get_collection(name):
+    return get_database()[name]
+
+
+class CollectionHandle:
+    """
+    Named collection that resolves the shared client only when first used,
+    so importing a module that holds handles has no connection side effects.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_collection(self.name), attribute)
+
+    def __repr__(self):
+        return f"CollectionHandle({self.name!r})"
+
+
+top_stories = CollectionHandle("top_stories")
+rankings_collection = CollectionHandle("rankings")  # MongoDB collection for rankings
+satisfaction_collection = CollectionHandle("satisfaction")  # MongoDB collection for satisfaction
+users_collection = CollectionHandle("users")  # MongoDB collection for users
+highlight_feedback_collection = CollectionHandle("highlight_feedback")
+user_article_feedback_collection = CollectionHandle("user_article_feedback")
+article_popularity_collection = CollectionHandle("article_popularity")  # Running ranking totals per article
+new_init_collection = CollectionHandle("new_init")  # Category/subcategory/source tree
+recommendations_collection = CollectionHandle("recommendations")  # Nightly top-K candidates per user and window
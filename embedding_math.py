@@ -0,0 +1,302 @@
+import hashlib
+
+import numpy as np
+
+# Weight each score contributes to the running mean (negative scores only count once)
+SCORE_WEIGHTS = {-1: 1, 0: 1, 1: 2}
+
+
+# --- Client-side updates ---
+# The same rules on float32 arrays, over a stack of users at once, for replaying
+# feedback history in batch and as the reference embedding_update_pipeline is
+# checked against (benchmarks/bench_embedding_updates.py).
+def mean_embedding_update(current_embeddings, feedback_counts, article_embeddings, weights):
+    """
+    Positive/neutral update: weighted running mean, applied row-wise to a stack.
+
+    Args:
+    - current_embeddings: (n, d) or (d,) array of user embeddings
+    - feedback_counts: (n,) or scalar weight already held by each embedding
+    - article_embeddings: (n, d) or (d,) array of article response arrays
+    - weights: (n,) or scalar weight of each article (2 for positive, 1 for neutral)
+
+    Returns:
+    - float32 array of updated embeddings, same shape as the inputs
+    """
+    current = np.asarray(current_embeddings, dtype=np.float32)
+    articles = np.asarray(article_embeddings, dtype=np.float32)
+    counts = np.asarray(feedback_counts, dtype=np.float32)[..., np.newaxis]
+    weights = np.asarray(weights, dtype=np.float32)[..., np.newaxis]
+    return (current * counts + articles * weights) / (counts + weights)
+
+
+def negative_embedding_update(current_embeddings, article_embeddings, global_embedding_centroid, rng):
+    """
+    Negative update: centroid push, distance-scaled push and random perturbation,
+    applied row-wise to a stack.
+
+    Args:
+    - current_embeddings: (n, d) or (d,) array of user embeddings
+    - article_embeddings: (n, d) or (d,) array of article response arrays
+    - global_embedding_centroid: (d,) or (n, d) persona centroid(s)
+    - rng (np.random.Generator): Source of the perturbation
+
+    Returns:
+    - float32 array of updated embeddings
+    """
+    current = np.asarray(current_embeddings, dtype=np.float32)
+    articles = np.asarray(article_embeddings, dtype=np.float32)
+    centroid = np.asarray(global_embedding_centroid, dtype=np.float32)
+
+    difference = current - articles
+    distance = np.linalg.norm(difference, axis=-1, keepdims=True)
+    shape = np.broadcast_shapes(current.shape, articles.shape)
+    perturbation = rng.normal(loc=0.0, scale=0.3, size=shape).astype(np.float32)
+
+    return (
+        current
+        + 0.4 * (centroid - articles)  # Global centroid push
+        + 0.3 * difference / (1.0 + distance)  # Distance-scaled push
+        + 0.3 * perturbation  # Random perturbation
+    )
+
+
+def fold_embedding_feedback(current_embedding, feedback_count, article_embeddings, scores, global_embedding_centroid, rng):
+    """
+    Apply a sequence of scored articles to one user embedding, in order.
+
+    Consecutive positive/neutral scores are collapsed into one weighted mean, so
+    only negative scores need a step of their own.
+
+    Args:
+    - current_embedding: (d,) user embedding, or None if the user has none yet
+    - feedback_count: Weight already held by current_embedding
+    - article_embeddings: (m, d) response arrays in submission order
+    - scores: (m,) scores (-1, 0 or 1)
+    - global_embedding_centroid: (d,) persona centroid used by negative scores
+    - rng (np.random.Generator): Source of the negative-score perturbation
+
+    Returns:
+    - Tuple of (float32 embedding or None, updated feedback count)
+    """
+    articles = np.asarray(article_embeddings, dtype=np.float32)
+    scores = np.array([score if score in SCORE_WEIGHTS else 0 for score in scores])
+    total = len(scores)
+
+    position = 0
+    if current_embedding is None:
+        if total == 0:
+            return None, feedback_count
+        # First feedback submission
+        current = articles[0].copy()
+        feedback_count = 1
+        position = 1
+    else:
+        current = np.asarray(current_embedding, dtype=np.float32)
+
+    weights = np.where(scores == 1, SCORE_WEIGHTS[1], SCORE_WEIGHTS[0]).astype(np.float32)
+    negatives = np.flatnonzero(scores[position:] == -1) + position
+
+    for stop in list(negatives) + [total]:
+        if stop > position:
+            run_weights = weights[position:stop]
+            run_weight = float(run_weights.sum())
+            current = (current * feedback_count + run_weights @ articles[position:stop]) / (feedback_count + run_weight)
+            feedback_count += int(run_weight)
+        if stop < total:
+            current = negative_embedding_update(current, articles[stop], global_embedding_centroid, rng)
+            feedback_count += SCORE_WEIGHTS[-1]
+        position = stop + 1
+
+    return current.astype(np.float32), feedback_count
+
+
+def embedding_version(user_embedding, feedback_count=None):
+    """
+    Short hash of a user embedding (and optionally its feedback count), so
+    results computed from an older embedding are not reused.
+
+    Args:
+    - user_embedding (list): The user's embedding, or None/[] if not set
+    - feedback_count (int, optional): Feedback count stored with the embedding
+
+    Returns:
+    - 16-character hex string
+    """
+    digest = hashlib.blake2b(np.asarray(user_embedding or [], dtype=np.float32).tobytes(), digest_size=8)
+    digest.update(str(feedback_count).encode())
+    return digest.hexdigest()
+
+
+# --- Server-side updates ---
+# The stored embedding is kept as sufficient statistics, embedding_sum (weighted
+# sum of article vectors) and embedding_weight, so feedback can be folded in by
+# one atomic update pipeline instead of a read-modify-write. user_embedding and
+# feedback_count are rewritten from them by every update for existing readers.
+EMBEDDING_SUM = "$embedding_sum"
+EMBEDDING_WEIGHT = "$embedding_weight"
+
+
+def _elementwise(expression, dimensions, *vectors):
+    """MQL array of expression(v1[i], v2[i], ...) for i in range(dimensions)"""
+    return {
+        "$map": {
+            "input": {"$range": [0, dimensions]},
+            "as": "i",
+            "in": expression(*[{"$arrayElemAt": [vector, "$$i"]} for vector in vectors])
+        }
+    }
+
+
+def _mean(dimensions):
+    return _elementwise(lambda total: {"$divide": [total, EMBEDDING_WEIGHT]}, dimensions, EMBEDDING_SUM)
+
+
+def statistics_from_embedding_stage():
+    """
+    Update stage deriving embedding_sum/embedding_weight from a legacy
+    user_embedding/feedback_count document; a no-op once they exist.
+    """
+    has_embedding = {"$isArray": "$user_embedding"}
+    count = {"$ifNull": ["$feedback_count", 0]}
+    return {
+        "$set": {
+            "embedding_sum": {"$ifNull": [
+                EMBEDDING_SUM,
+                {"$cond": [has_embedding, {"$map": {"input": "$user_embedding", "as": "x", "in": {"$multiply": ["$$x", count]}}}, None]}
+            ]},
+            "embedding_weight": {"$ifNull": [EMBEDDING_WEIGHT, {"$cond": [has_embedding, count, 0]}]}
+        }
+    }
+
+
+def positive_feedback_stage(article_embeddings, weights):
+    """
+    Update stage adding a run of positive/neutral feedback; the running mean
+    becomes a plain sum, so this needs no knowledge of the current embedding.
+
+    Args:
+    - article_embeddings: (m, d) response arrays
+    - weights: (m,) weight of each article (2 for positive, 1 for neutral)
+
+    Returns:
+    - $set stage
+    """
+    articles = np.asarray(article_embeddings, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    delta = (weights @ articles).tolist()
+    return {
+        "$set": {
+            "embedding_sum": _elementwise(lambda total, x: {"$add": [total, x]}, len(delta), EMBEDDING_SUM, delta),
+            "embedding_weight": {"$add": [EMBEDDING_WEIGHT, int(weights.sum())]}
+        }
+    }
+
+
+def negative_feedback_stage(article_embedding, global_embedding_centroid, rng):
+    """
+    Update stage applying negative_embedding_update to the stored mean.
+
+    The centroid push and the random perturbation do not depend on the current
+    embedding and are computed here; the distance-scaled push is evaluated
+    server-side from embedding_sum / embedding_weight, so the result matches
+    negative_embedding_update without reading the user first.
+
+    Args:
+    - article_embedding: (d,) response array of the article
+    - global_embedding_centroid: (d,) persona centroid
+    - rng (np.random.Generator): Source of the perturbation
+
+    Returns:
+    - $set stage
+    """
+    article = np.asarray(article_embedding, dtype=np.float64)
+    centroid = np.asarray(global_embedding_centroid, dtype=np.float64)
+    dimensions = len(article)
+    perturbation = rng.normal(loc=0.0, scale=0.3, size=dimensions)
+    constant = (0.4 * (centroid - article) + 0.3 * perturbation).tolist()
+    article = article.tolist()
+
+    difference = _elementwise(lambda mean, x: {"$subtract": [mean, x]}, dimensions, "$$mean", article)
+    distance = {"$sqrt": {"$reduce": {
+        "input": "$$difference",
+        "initialValue": 0,
+        "in": {"$add": ["$$value", {"$multiply": ["$$this", "$$this"]}]}
+    }}}
+    new_weight = {"$add": [EMBEDDING_WEIGHT, SCORE_WEIGHTS[-1]]}
+    new_sum = _elementwise(
+        lambda mean, diff, shift: {"$multiply": [{"$add": [mean, shift, {"$multiply": ["$$push", diff]}]}, new_weight]},
+        dimensions, "$$mean", "$$difference", constant
+    )
+    return {
+        "$set": {
+            "embedding_sum": {"$let": {
+                "vars": {"mean": _mean(dimensions)},
+                "in": {"$let": {
+                    "vars": {"difference": difference},
+                    "in": {"$let": {"vars": {"push": {"$divide": [0.3, {"$add": [1, distance]}]}}, "in": new_sum}}
+                }}
+            }},
+            "embedding_weight": new_weight
+        }
+    }
+
+
+def embedding_update_pipeline(article_embeddings, scores, global_embedding_centroid, rng):
+    """
+    Update pipeline folding a submission into a users document in one atomic
+    round trip; the server-side equivalent of fold_embedding_feedback, which
+    benchmarks/bench_embedding_updates.py checks it against.
+
+    A user without an embedding takes the first article as their embedding
+    with weight 1, decided server-side so concurrent first submissions from two
+    tabs cannot both do it.
+
+    Args:
+    - article_embeddings: (m, d) response arrays in submission order, m >= 1
+    - scores: (m,) scores (-1, 0 or 1)
+    - global_embedding_centroid: (d,) persona centroid used by negative scores
+    - rng (np.random.Generator): Source of the negative-score perturbation
+
+    Returns:
+    - List of update stages for update_one / find_one_and_update
+    """
+    articles = np.asarray(article_embeddings, dtype=np.float64)
+    scores = [score if score in SCORE_WEIGHTS else 0 for score in scores]
+    dimensions = articles.shape[1]
+
+    first = articles[0].tolist()
+    pipeline = [
+        statistics_from_embedding_stage(),
+        {"$set": {"_first_feedback": {"$not": [{"$gt": [EMBEDDING_WEIGHT, 0]}]}}},
+        {"$set": {
+            "embedding_sum": {"$cond": ["$_first_feedback", first, EMBEDDING_SUM]},
+            "embedding_weight": {"$cond": ["$_first_feedback", 1, EMBEDDING_WEIGHT]}
+        }}
+    ]
+
+    def stage_for(start, stop):
+        if scores[start] == -1:
+            return negative_feedback_stage(articles[start], global_embedding_centroid, rng)
+        return positive_feedback_stage(articles[start:stop], [SCORE_WEIGHTS[score] for score in scores[start:stop]])
+
+    # The first article is only applied as feedback if the user already had an embedding
+    first_stage = stage_for(0, 1)
+    pipeline.append({"$set": {
+        field: {"$cond": ["$_first_feedback", f"${field}", expression]}
+        for field, expression in first_stage["$set"].items()
+    }})
+
+    position = 1
+    while position < len(scores):
+        stop = position + 1
+        if scores[position] != -1:
+            # Consecutive positive/neutral scores are one $inc-like stage
+            while stop < len(scores) and scores[stop] != -1:
+                stop += 1
+        pipeline.append(stage_for(position, stop))
+        position = stop
+
+    pipeline.append({"$set": {"user_embedding": _mean(dimensions), "feedback_count": EMBEDDING_WEIGHT}})
+    pipeline.append({"$unset": "_first_feedback"})
+    return pipeline
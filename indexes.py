@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta
+
+import pymongo
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+# Listing order used by every paged top_stories query (see keyset_match in Login.py)
+PUBLISHED_ORDER = [("published", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+# Makes the feedback upserts idempotent; duplicates left by older code must be
+# removed first (remove_duplicate_feedback)
+FEEDBACK_UNIQUE_INDEX = "user_article_feedback_unique"
+# Users are not merged automatically; duplicate_usernames lists what blocks it
+USERNAME_UNIQUE_INDEX = "users_username_unique"
+
+
+def required_indexes(stratify_by=None):
+    """
+    Indexes the page queries depend on, per collection.
+
+    Args:
+    - stratify_by (str, optional): [RANDOM_SAMPLING] stratify_by field, indexed with `rand`
+
+    Returns:
+    - Dict of collection name to list of IndexModel
+    """
+    indexes = {
+        "users": [
+            IndexModel([("username", pymongo.ASCENDING)], unique=True, name=USERNAME_UNIQUE_INDEX)
+        ],
+        "user_article_feedback": [
+            # Also serves find({"user_name": ...}) through its prefix
+            IndexModel(
+                [("user_name", pymongo.ASCENDING), ("article_id", pymongo.ASCENDING), ("feedback_type", pymongo.ASCENDING)],
+                unique=True,
+                name=FEEDBACK_UNIQUE_INDEX
+            )
+        ],
+        "top_stories": [
+            IndexModel(PUBLISHED_ORDER, name="top_stories_published"),
+            IndexModel([("rand", pymongo.ASCENDING)], name="top_stories_rand")
+        ],
+        "article_popularity": [
+            IndexModel([("total_score", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)], name="article_popularity_total_score")
+        ]
+    }
+    if stratify_by:
+        indexes["top_stories"].append(
+            IndexModel([(stratify_by, pymongo.ASCENDING), ("rand", pymongo.ASCENDING)], name=f"top_stories_{stratify_by}_rand")
+        )
+    return indexes
+
+
+def remove_duplicate_feedback(collection, dry_run=False, batch_size=1000):
+    """
+    Delete duplicate feedback rows, keeping the newest per (user_name, article_id, feedback_type).
+
+    Double submits from before the unique index existed left duplicates that
+    make its build fail. Rows are ordered by timestamp, then _id, so the row
+    kept is the most recent one.
+
+    Args:
+    - collection (Collection): user_article_feedback
+    - dry_run (bool): Only count the rows that would be deleted
+    - batch_size (int): Rows deleted per delete_many
+
+    Returns:
+    - Number of rows deleted (or that would be deleted)
+    """
+    groups = collection.aggregate([
+        {"$sort": {"timestamp": -1, "_id": -1}},
+        {"$group": {
+            # The unique index treats a missing field as null, so group it the same way
+            "_id": {field: {"$ifNull": [f"${field}", None]} for field in ("user_name", "article_id", "feedback_type")},
+            "ids": {"$push": "$_id"}
+        }},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ], allowDiskUse=True)
+    # The first id of each group is the newest row, which is kept
+    extra_ids = [row_id for group in groups for row_id in group["ids"][1:]]
+    if not dry_run:
+        for start in range(0, len(extra_ids), batch_size):
+            collection.delete_many({"_id": {"$in": extra_ids[start:start + batch_size]}})
+    return len(extra_ids)
+
+
+def duplicate_usernames(collection, limit=20):
+    """
+    Usernames held by more than one users document, which block the unique index.
+
+    Args:
+    - collection (Collection): users
+    - limit (int): Maximum number of usernames returned
+
+    Returns:
+    - List of dicts with username and count, most duplicated first
+    """
+    return list(collection.aggregate([
+        {"$group": {"_id": "$username", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "username": "$_id", "count": 1}}
+    ], allowDiskUse=True))
+
+
+def index_problems(report):
+    """Entries of an ensure_indexes report whose index is not in place as declared"""
+    return [entry for entry in report if entry["status"] not in ("exists", "created")]
+
+
+def ensure_indexes(database, stratify_by=None, dedupe_feedback=False):
+    """
+    Create any required index that is missing.
+
+    An existing index with the same keys counts as present whatever its name,
+    so indexes created by hand or by older code are not duplicated. A failed
+    build (e.g. duplicate rows blocking a unique index) is reported, not
+    raised; see index_problems.
+
+    Args:
+    - database (Database): Database holding the app collections
+    - stratify_by (str, optional): [RANDOM_SAMPLING] stratify_by field
+    - dedupe_feedback (bool): Delete duplicate feedback rows before building the
+      unique feedback index. Only the command-line scripts pass this; the app
+      never deletes feedback on its own
+
+    Returns:
+    - List of dicts with collection, index name, keys, status ("exists",
+      "created" or "failed: <reason>") and duplicates removed
+    """
+    report = []
+    for collection_name, models in required_indexes(stratify_by).items():
+        collection = database[collection_name]
+        existing = {tuple(info["key"].items()): info for info in collection.list_indexes()}
+        for model in models:
+            spec = model.document
+            keys = tuple(spec["key"].items())
+            entry = {"collection": collection_name, "index": spec["name"], "keys": dict(keys), "duplicates_removed": 0}
+            if keys in existing:
+                entry["status"] = "exists"
+                if spec.get("unique") and not existing[keys].get("unique"):
+                    entry["status"] = f"exists as {existing[keys]['name']} without the unique constraint"
+            else:
+                try:
+                    if dedupe_feedback and spec["name"] == FEEDBACK_UNIQUE_INDEX:
+                        entry["duplicates_removed"] = remove_duplicate_feedback(collection)
+                    collection.create_indexes([model])
+                    entry["status"] = "created"
+                except OperationFailure as e:
+                    entry["status"] = f"failed: {(e.details or {}).get('errmsg', e)}"
+            report.append(entry)
+    return report
+
+
+def page_queries(database):
+    """
+    Representative query of each page, built with placeholder values.
+
+    Args:
+    - database (Database): Database holding the app collections
+
+    Returns:
+    - List of (page, collection name, description, cursor) tuples
+    """
+    now = datetime.now()
+    top_stories = database["top_stories"]
+    return [
+        ("all pages", "users", "find username", database["users"].find({"username": ""})),
+        ("all pages", "user_article_feedback", "find user_name",
+         database["user_article_feedback"].find({"user_name": ""}, {"article_id": 1})),
+        ("Curated Articles", "top_stories", "published window, newest first",
+         top_stories.find({"published": {"$gte": now - timedelta(days=7), "$lte": now}}).sort(PUBLISHED_ORDER).limit(5)),
+        ("Curated Articles", "top_stories", "hydrate candidates by _id",
+         top_stories.find({"_id": {"$in": []}})),
+        ("Latest News", "top_stories", "newest first", top_stories.find({}).sort(PUBLISHED_ORDER).limit(5)),
+        ("Popular", "article_popularity", "top total_score",
+         database["article_popularity"].find({}, {"total_score": 1}).sort([("total_score", -1), ("_id", 1)]).limit(10)),
+        ("Random Articles", "top_stories", "rand from pivot",
+         top_stories.find({"rand": {"$gte": 0.5}}).sort("rand", 1).limit(5))
+    ]
+
+
+def plan_stages(plan):
+    """Stage names of a winning plan, outermost first"""
+    if not isinstance(plan, dict):
+        return []
+    # Slot-based engine explains nest the classic plan under queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages = [plan["stage"]] if "stage" in plan else []
+    for child in [plan.get("inputStage"), *plan.get("inputStages", [])]:
+        stages.extend(plan_stages(child))
+    return stages
+
+
+def explain_page_queries(database):
+    """
+    Explain every page query and flag the ones that scan the whole collection.
+
+    Args:
+    - database (Database): Database holding the app collections
+
+    Returns:
+    - List of dicts with page, collection, query, plan stages and collscan flag
+    """
+    report = []
+    for page, collection_name, description, cursor in page_queries(database):
+        stages = plan_stages(cursor.explain().get("queryPlanner", {}).get("winningPlan"))
+        report.append({
+            "page": page,
+            "collection": collection_name,
+            "query": description,
+            "plan": " <- ".join(stages),
+            "collscan": "COLLSCAN" in stages
+        })
+    return report
@@ -2,13 +2,13 @@ import streamlit as st
 import pandas as pd
 
 from Login import (
-    client, db, users_collection, format_article, load_css,
-    authenticate_user
+    format_article, load_css,
+    authenticate_user,
+    get_user_profile,
+    update_user_profile,
+    get_category_tree_cache
 )
-
-
-db = client["techcrunch_db"]
-new_init_db = db["new_init"]
+from category_tree import CategoryTree
 
 # Load CSS and set title
 load_css()
@@ -25,7 +25,7 @@ if not authenticate_user(st.session_state.get("user_name", "")):
     st.stop()
 
 # Check if user is already initialized
-user = users_collection.find_one({"username": st.session_state.user_name})
+user = get_user_profile(st.session_state.user_name)
 if user and "user_interests" in user:
     st.success(f"Your preferences are already set")
     
@@ -70,19 +70,13 @@ if user and "user_interests" in user:
         st.write("You can now proceed to the Curated Articles or Random Articles pages.")
         st.stop()
 
-# Load category information from the new_init collection
-def load_category_info():
+# Load category information from the new_init collection (cached for all sessions)
+def load_category_tree():
     try:
-        category_data = new_init_db.find_one({})
-        if category_data:
-            # Remove the MongoDB _id field
-            if "_id" in category_data:
-                del category_data["_id"]
-            return category_data
-        return {}
+        return get_category_tree_cache().get()
     except Exception as e:
         st.error(f"Error loading category information: {e}")
-        return {}
+        return CategoryTree({})
 
 # Initialize session state for selected categories if not already set
 if "user_selections" not in st.session_state:
@@ -93,7 +87,8 @@ if "expanded_categories" not in st.session_state:
     st.session_state.expanded_categories = set()
 
 # Get category information
-categories = load_category_info()
+category_tree = load_category_tree()
+categories = category_tree.tree
 # Do NOT pre-check everything — we will only initialize visible ones later
 if "user_selections" not in st.session_state:
     st.session_state.user_selections = {}
@@ -291,27 +286,17 @@ if st.button("Save My Preferences", type="primary"):
     if not visible_checked_selections:
         st.error("Please select at least one topic or subtopic.")
     else:
-        user_interests = {
-            "categories": list(set([item["category"] for item in visible_checked_selections.values()])),
-            "subcategories": list(set([f"{item['category']}: {item['subcategory']}" for item in visible_checked_selections.values()
-                                       if item["subcategory"] != "general"])),
-            "sources": list(set([source for item in visible_checked_selections.values()
-                                 for source in item["sources"]])),
-            "selection_keys": list(visible_checked_selections.keys()),
-            "sources_by_selection": {key: item["sources"] for key, item in visible_checked_selections.items()}
-        }
+        # Sources per selection come from the precomputed index of the tree
+        user_interests = category_tree.interests(visible_checked_selections)
 
-        users_collection.update_one(
-            {"username": st.session_state.user_name},
-            {"$set": {
-                "user_interests": user_interests,
-                "initialized": True
-            }}
-        )
+        update_user_profile(st.session_state.user_name, {
+            "user_interests": user_interests,
+            "initialized": True
+        })
 
         st.session_state.needs_initialization = False
         st.success("Your preferences have been saved successfully!")
         st.write("You can now proceed to the Curated Articles, Latest News or Random Articles pages using the side bar.")
         st.rerun()
         # if st.button("Start Exploring Articles"):
-        #     # st.session_state.needs_initialization = False
\ No newline at end of file
+        #     # st.session_state.needs_initialization = False
@@ -3,21 +3,34 @@ import pandas as pd
 import uuid
 from datetime import datetime, timedelta
 from Login import (
-    client, 
-    db, 
-    users_collection, 
-    rankings_collection, 
-    highlight_feedback_collection, 
-    satisfaction_collection,
-    top_stories, 
-    format_article, 
+    insert_rankings, 
+    queue_insert,
+    format_article,
+    card_highlights, 
     load_articles_from_mongodb, 
     load_css, 
     authenticate_user,
-    update_user_embedding,
+    get_user_profile,
+    invalidate_user_profile,
+    update_user_embedding_batch,
+    load_response_arrays,
     load_articles_vector_search,
-    track_user_article_feedback,
-    get_user_feedback_article_ids
+    track_user_article_feedback_bulk,
+    get_seen_articles,
+    get_vector_candidates,
+    hydrate_candidates,
+    CARD_PROJECTION,
+    candidate_page,
+    page_token,
+    keyset_match,
+    get_prefetch_executor,
+    embedding_version
+)
+from database import (
+    users_collection,
+    highlight_feedback_collection,
+    satisfaction_collection,
+    top_stories
 )
 import streamlit_analytics
 
@@ -33,11 +46,12 @@ if not st.session_state.get("is_valid_user", False) or not authenticate_user(st.
     st.stop()
 
 # --- Get User Profile ---
-user_data = users_collection.find_one({"username": st.session_state.user_name})
+# Cached for the session; kept current by update_user_embedding_batch
+user_data = get_user_profile(st.session_state.user_name)
 feedback_count = user_data.get("feedback_count", 0)
 user_embedding = user_data.get("user_embedding", [])
 # For non-vector search queries, show the latest news from the top_stories collection
-selected_collection = db["top_stories"]
+selected_collection = top_stories
 
 # --- Add Date Filter UI ---
 col1, col2 = st.columns([2, 1])
@@ -70,80 +84,106 @@ elif date_range == "Last month":
 else:  # All time
     start_date = datetime(1970, 1, 1)  # Very old date to get all articles
 
-def load_articles_with_date_filter(user_name, user_embedding, offset, limit, start_date, end_date, feedback_count, selected_collection):
-    """Load articles with date filtering"""
-    try:
-        # Get IDs of articles user has already provided feedback on
-        feedback_article_ids = get_user_feedback_article_ids(user_name)
-        
-        # Convert feedback article IDs to ObjectId
-        from bson.objectid import ObjectId
-        feedback_article_ids = [ObjectId(article_id) for article_id in feedback_article_ids]
-        
-        # Choose loading method based on feedback count and embedding
-        if feedback_count >= 5 and isinstance(user_embedding, list) and len(user_embedding) > 0:
-            # Vector search with date filter - move vectorSearch to first position
-            pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",
-                        "path": "response_array",
-                        "queryVector": user_embedding,
-                        "numCandidates": 500,
-                        "limit": 500  # Get more candidates to allow for filtering
-                    }
-                },
-                {
-                    "$match": {
-                        "_id": {"$nin": feedback_article_ids},
-                        "published": {
-                            "$gte": start_date,
-                            "$lte": end_date
-                        }
-                    }
-                },
-                {
-                    "$skip": offset
-                },
-                {
-                    "$limit": limit
-                }
-            ]
-            
-            results = list(db.top_stories.aggregate(pipeline))
-
-            count = db.top_stories.count_documents({
-                "published": {
-                    "$gte": start_date,
-                    "$lte": end_date
-                }
-            })
-            print(f"Total articles in date range: {count}")
+def query_articles_with_date_filter(user_name, seen_articles, user_embedding, after, limit, start_date, end_date, feedback_count, selected_collection):
+    """
+    Query one page of articles with date filtering.
+    
+    Pages are resumed from a cursor token (last score/_id for vector results,
+    last published/_id otherwise) so every Load More costs the same and pages
+    stay stable while new articles are ingested. Vector pages are cut from the
+    cached candidate ranking, so only the displayed documents are read. Uses no
+    Streamlit calls, so it can also run on the prefetch workers.
+    
+    Args:
+    - user_name (str): Owner of the embedding, for the candidate cache key
+    - seen_articles (SeenArticleSet): Articles the user already gave feedback on; filtered client-side
+    
+    Returns:
+    - Tuple of (articles, token for the next page or None)
+    """
+    # Choose loading method based on feedback count and embedding
+    if feedback_count >= 5 and isinstance(user_embedding, list) and len(user_embedding) > 0:
+        # One deep vector retrieval per user, embedding and window, then paged locally
+        candidates = get_vector_candidates(user_name, user_embedding, start_date, end_date, feedback_count)
+        page, has_more = candidate_page(candidates, after, limit, seen_articles)
+        results = hydrate_candidates(page)
+        next_token = {"_id": page[-1][0], "vector_score": page[-1][1]} if page and has_more else None
+        return results, next_token
+    else:
+        # Regular collection query with date filter from top_stories
+        query = {
+            "published": {
+                "$gte": start_date,
+                "$lte": end_date
+            },
+            **keyset_match(after, "published")
+        }
+        cursor = (
+            selected_collection.find(query, CARD_PROJECTION)
+            .sort([("published", -1), ("_id", -1)])
+            .batch_size(2 * limit)  # Read until `limit` unseen articles are found
+        )
+        articles = seen_articles.take_unseen(cursor, limit=limit)
+        return articles, page_token(articles[-1], "published") if articles else None
 
-            excluded_count = db.top_stories.count_documents({
-                "published": {
-                    "$gte": start_date,
-                    "$lte": end_date
-                },
-                "_id": {"$in": feedback_article_ids}
-            })
-            print(f"Articles excluded due to feedback: {excluded_count}")
-            print(offset, limit, start_date, end_date, feedback_count, selected_collection)
-            return results
-        else:
-            # Regular collection query with date filter from top_stories
-            query = {
-                "_id": {"$nin": feedback_article_ids},
-                "published": {
-                    "$gte": start_date,
-                    "$lte": end_date
-                }
-            }
-            articles = list(selected_collection.find(query).skip(offset).limit(limit))
-            return articles
+def load_articles_with_date_filter(user_name, user_embedding, after, limit, start_date, end_date, feedback_count, selected_collection):
+    """Load one page of articles with date filtering, reporting errors on the page"""
+    try:
+        return query_articles_with_date_filter(
+            user_name, get_seen_articles(user_name), user_embedding, after, limit,
+            start_date, end_date, feedback_count, selected_collection
+        )
     except Exception as e:
         st.error(f"Error loading articles with date filter: {e}")
-        return []
+        return [], None
+
+def prefetch_key(after):
+    """Everything the next page depends on; a buffered page is only used if this still matches"""
+    return (
+        st.session_state.user_name,
+        embedding_version(user_embedding, feedback_count),
+        start_date,
+        end_date,
+        after
+    )
+
+def schedule_prefetch():
+    """Start loading the page after the last one shown, unless that is already under way"""
+    after = st.session_state.get("articles_page_token")
+    if not after:
+        return
+    key = prefetch_key(after)
+    prefetch = st.session_state.get("curated_prefetch")
+    if prefetch is not None:
+        if prefetch["key"] == key:
+            return
+        # Date filter, embedding or position changed
+        prefetch["future"].cancel()
+    st.session_state.curated_prefetch = {
+        "key": key,
+        "future": get_prefetch_executor().submit(
+            query_articles_with_date_filter,
+            st.session_state.user_name, get_seen_articles(st.session_state.user_name), user_embedding, after, 5,
+            start_date, end_date, feedback_count, selected_collection
+        )
+    }
+
+def take_prefetched_page(after):
+    """
+    Return the buffered page that follows `after`, waiting for it if it is still
+    loading, or None if nothing usable was prefetched.
+    """
+    prefetch = st.session_state.pop("curated_prefetch", None)
+    if prefetch is None:
+        return None
+    if prefetch["key"] != prefetch_key(after):
+        prefetch["future"].cancel()
+        return None
+    try:
+        return prefetch["future"].result()
+    except Exception:
+        # Fall back to a synchronous load, which reports the error
+        return None
 
 # --- Initialize session state variables for articles ---
 # Reset article data if date filter has changed
@@ -152,10 +192,10 @@ if "last_date_filter" not in st.session_state:
 
 if st.session_state.last_date_filter != (start_date, end_date) or "articles_data" not in st.session_state:
     # Load articles with date filter
-    articles_data = load_articles_with_date_filter(
+    articles_data, next_page_token = load_articles_with_date_filter(
         user_name=st.session_state.user_name,
         user_embedding=user_embedding,
-        offset=0,
+        after=None,
         limit=5,
         start_date=start_date,
         end_date=end_date,
@@ -166,7 +206,7 @@ if st.session_state.last_date_filter != (start_date, end_date) or "articles_data
     # Update session state
     st.session_state.articles_data = articles_data
     st.session_state.article_content = [format_article(article) for article in articles_data]
-    st.session_state.articles_offset = 5
+    st.session_state.articles_page_token = next_page_token
     st.session_state.last_date_filter = (start_date, end_date)
     
     # Initialize article rankings (1 to N)
@@ -187,14 +227,14 @@ st.info(f"Showing articles from {start_date.strftime('%b %d, %Y')} to {end_date.
 
 # Button to refresh latest articles
 if st.sidebar.button("Refresh Curated Articles"):
-    # Get the updated user embedding
-    user_embedding = users_collection.find_one({"username": st.session_state.user_name}).get("user_embedding", [])
-    print("This is the user_embedding", user_embedding)
+    # Re-read the profile in case another session changed the embedding
+    invalidate_user_profile(st.session_state.user_name)
+    user_data = get_user_profile(st.session_state.user_name)
+    feedback_count = user_data.get("feedback_count", 0)
+    user_embedding = user_data.get("user_embedding", [])
     # Reset the articles data and content
     st.session_state.articles_data = []
     st.session_state.article_content = []
-    # Reset the offset for loading more articles
-    st.session_state.articles_offset = 5
     # Reset article rankings
     if "article_rankings" in st.session_state:
         del st.session_state.article_rankings
@@ -202,10 +242,10 @@ if st.sidebar.button("Refresh Curated Articles"):
     if "display_order" in st.session_state:
         del st.session_state.display_order
     # Load articles with date filter
-    articles_data = load_articles_with_date_filter(
+    articles_data, next_page_token = load_articles_with_date_filter(
         user_name=st.session_state.user_name,
         user_embedding=user_embedding,
-        offset=0,
+        after=None,
         limit=5,
         start_date=start_date,
         end_date=end_date,
@@ -214,6 +254,8 @@ if st.sidebar.button("Refresh Curated Articles"):
     )
     st.session_state.articles_data = articles_data
     st.session_state.article_content = [format_article(article) for article in articles_data]
+    # Resume Load More after the last article shown
+    st.session_state.articles_page_token = next_page_token
     # Initialize article rankings (1 to N)
     st.session_state.article_rankings = list(range(1, len(articles_data) + 1))
     # Initialize display order
@@ -222,17 +264,24 @@ if st.sidebar.button("Refresh Curated Articles"):
 
 # --- Sidebar: Load More Button ---
 if st.sidebar.button("Load More"):
-    offset = st.session_state.articles_offset
-    new_articles = load_articles_with_date_filter(
-        user_name=st.session_state.user_name,
-        user_embedding=user_embedding,
-        offset=offset,
-        limit=5,
-        start_date=start_date,
-        end_date=end_date,
-        feedback_count=feedback_count,
-        selected_collection=selected_collection
-    )
+    # Without a token the first page came back empty, so there is nothing to resume
+    new_articles, next_page_token = [], None
+    if st.session_state.get("articles_page_token"):
+        # Usually already loaded in the background after the previous page was rendered
+        prefetched = take_prefetched_page(st.session_state.articles_page_token)
+        if prefetched is not None:
+            new_articles, next_page_token = prefetched
+        else:
+            new_articles, next_page_token = load_articles_with_date_filter(
+                user_name=st.session_state.user_name,
+                user_embedding=user_embedding,
+                after=st.session_state.articles_page_token,
+                limit=5,
+                start_date=start_date,
+                end_date=end_date,
+                feedback_count=feedback_count,
+                selected_collection=selected_collection
+            )
         
     if new_articles:
         st.session_state.articles_data.extend(new_articles)
@@ -249,7 +298,7 @@ if st.sidebar.button("Load More"):
         new_display_indices = list(range(current_max_display + 1, current_max_display + 1 + len(new_articles)))
         st.session_state.display_order.extend(new_display_indices)
         
-        st.session_state.articles_offset += len(new_articles)
+        st.session_state.articles_page_token = next_page_token
     else:
         st.sidebar.warning("No more articles available for this date range.")
 
@@ -314,7 +363,7 @@ else:
             st.markdown(st.session_state.article_content[article_idx], unsafe_allow_html=True)
         
         with col2:
-            highlights = article.get("highlights", [])
+            highlights = card_highlights(article)
             if isinstance(highlights, list) and len(highlights) > 0:
                 total_highlights = len(highlights)
                 highlight_key = f'curated_highlight_index_{article_idx}'
@@ -322,8 +371,6 @@ else:
                     st.session_state[highlight_key] = 0
                 current_index = st.session_state[highlight_key]
                 current_highlight = highlights[current_index]
-                if len(current_highlight) > 250:
-                    current_highlight = current_highlight[:250] + '...'
                 highlight_count_text = f"Highlight {current_index + 1} of {total_highlights}"
             else:
                 current_highlight = "no highlights available"
@@ -372,8 +419,6 @@ else:
                     else:
                         try:
                             current_highlight = highlights[current_index]
-                            if len(current_highlight) > 250:
-                                current_highlight = current_highlight[:250] + '...'
                                 
                             highlight_feedback_data = {
                                 "article_id": str(article.get("_id")),
@@ -387,7 +432,7 @@ else:
                                 "timestamp": datetime.now(),
                                 "page": "curated_articles"
                             }
-                            highlight_feedback_collection.insert_one(highlight_feedback_data)
+                            queue_insert(highlight_feedback_collection, highlight_feedback_data)
                             st.success("Highlight score saved!")
                         except Exception as e:
                             st.error(f"Error saving highlight score: {e}")
@@ -423,6 +468,9 @@ else:
             display_position = st.session_state.display_order.index(article_idx) + 1 if article_idx in st.session_state.display_order else "Unknown"
             st.markdown(f"**Display Position: {display_position}**")
 
+    # The current batch is on screen; load the next one while the user reads
+    schedule_prefetch()
+
 # --- Submit Rankings Button ---
 if st.button("Submit Article Scores and Rankings"):
     if not st.session_state.get("user_name"):
@@ -431,17 +479,23 @@ if st.button("Submit Article Scores and Rankings"):
         submission_id = str(uuid.uuid4())
         submission_timestamp = datetime.now()
         rankings = []
+        embedding_feedback = []
+        
+        # Track article ranking feedback for the whole submission at once
+        track_user_article_feedback_bulk(
+            st.session_state.user_name, 
+            [article.get("_id") for article in st.session_state.articles_data], 
+            "curated_articles"
+        )
+        # Embeddings are left out of the listing queries; fetch them for this submission only
+        response_arrays = load_response_arrays(article.get("_id") for article in st.session_state.articles_data)
         for i, article in enumerate(st.session_state.articles_data):
             score = st.session_state.get(f'score_{i}_article')
             rank_position = st.session_state.article_rankings[i] if i < len(st.session_state.article_rankings) else i + 1
 
-            track_user_article_feedback(
-                st.session_state.user_name, 
-                article.get("_id"), 
-                "curated_articles",
-            )
 
             ranking_data = {
+                "article_id": str(article.get("_id")),
                 "title": article.get("title"),
                 "score": score,
                 "rank_position": rank_position,
@@ -457,20 +511,21 @@ if st.button("Submit Article Scores and Rankings"):
                 ranking_data["feedback"] = feedback
             rankings.append(ranking_data)
 
-            if article.get('response_array'):
-                try:
-                    updated_embedding = update_user_embedding(
-                        users_collection, 
-                        st.session_state.user_name, 
-                        article['response_array'],
-                        score
-                    )
-                except Exception as e:
-                    st.error(f"Error updating user embedding for article {i+1}: {e}")
+            if article.get("_id") in response_arrays:
+                embedding_feedback.append((response_arrays[article["_id"]], score))
+        
+        if embedding_feedback:
+            try:
+                update_user_embedding_batch(
+                    users_collection, 
+                    st.session_state.user_name, 
+                    embedding_feedback
+                )
+            except Exception as e:
+                st.error(f"Error updating user embedding: {e}")
         
         try:
-            if rankings:
-                rankings_collection.insert_many(rankings)
+            insert_rankings(rankings)
             st.success("Your article scores and rankings have been saved!")
         except Exception as e:
             st.error(f"Error saving article scores and rankings: {e}")
@@ -496,7 +551,7 @@ if st.button("Submit Satisfaction Score", key="curated_satisfaction_button"):
                 "comments": comments,
                 "page": "curated_articles"
             }
-            satisfaction_collection.insert_one(satisfaction_data)
+            queue_insert(satisfaction_collection, satisfaction_data)
             st.success("Thank you! Your satisfaction score and comments have been saved.")
         except Exception as e:
             st.error(f"Error saving satisfaction score: {e}")
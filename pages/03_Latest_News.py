@@ -3,15 +3,17 @@ import pandas as pd
 from datetime import datetime
 from Login import(
     format_article,
+    card_highlights,
     load_css,
-    rankings_collection,
-    satisfaction_collection,
-    highlight_feedback_collection,
-    users_collection,
-    update_user_embedding,
+    insert_rankings,
+    queue_insert,
+    update_user_embedding_batch,
+    load_response_arrays,
     load_latest_articles,
-    track_user_article_feedback
+    track_user_article_feedback_bulk,
+    page_token
 )
+from database import satisfaction_collection, highlight_feedback_collection, users_collection
 import streamlit_analytics
 import uuid
 
@@ -50,7 +52,7 @@ else:
         
         with col2:
             # Get the highlights data; expect a list of strings.
-            highlights = article.get("highlights", [])
+            highlights = card_highlights(article)
             if isinstance(highlights, list) and len(highlights) > 0:
                 total_highlights = len(highlights)
                 # Set a unique key for the current article's highlight index in session state
@@ -58,10 +60,8 @@ else:
                 if highlight_key not in st.session_state:
                     st.session_state[highlight_key] = 0
                 current_index = st.session_state[highlight_key]
-                # Get the current highlight and truncate if needed
+                # Get the current highlight (already truncated for display)
                 current_highlight = highlights[current_index]
-                if len(current_highlight) > 250:
-                    current_highlight = current_highlight[:250] + '...'
                 highlight_count_text = f"Highlight {current_index + 1} of {total_highlights}"
             else:
                 current_highlight = "no highlights available"
@@ -124,8 +124,6 @@ else:
                     else:
                         try:
                             current_highlight = highlights[current_index]
-                            if len(current_highlight) > 250:
-                                current_highlight = current_highlight[:250] + '...'
                                 
                             highlight_feedback_data = {
                                 "article_id": str(article.get("_id")),
@@ -139,7 +137,7 @@ else:
                                 "timestamp": datetime.now(),
                                 "page": "latest_news"
                             }
-                            highlight_feedback_collection.insert_one(highlight_feedback_data)
+                            queue_insert(highlight_feedback_collection, highlight_feedback_data)
                             st.success("Highlight score saved!")
                         except Exception as e:
                             st.error(f"Error saving highlight score: {e}")
@@ -157,16 +155,21 @@ if st.button("Submit Article Scores"):
     else:
         submission_id = str(uuid.uuid4())
         rankings = []
+        embedding_feedback = []
+        
+        # Track article ranking feedback for the whole submission at once
+        track_user_article_feedback_bulk(
+            st.session_state.user_name, 
+            [article.get("_id") for article in st.session_state.latest_articles], 
+            "latest_news"
+        )
+        # Embeddings are left out of the listing queries; fetch them for this submission only
+        response_arrays = load_response_arrays(article.get("_id") for article in st.session_state.latest_articles)
         for i, article in enumerate(st.session_state.latest_articles):
             score = st.session_state.get(f'score_{i}_article')
 
-            # Track article ranking feedback
-            track_user_article_feedback(
-                st.session_state.user_name, 
-                article.get("_id"), 
-                "latest_news",
-            )
             ranking_data = {
+                "article_id": str(article.get("_id")),
                 "title": article.get("title"),
                 "rank": score,
                 "submission_id": submission_id,
@@ -179,22 +182,22 @@ if st.button("Submit Article Scores"):
             rankings.append(ranking_data)
 
         # Check if article has a response_array
-            if article.get('response_array'):
-                try:
-                    updated_embedding = update_user_embedding(
-                        users_collection, 
-                        st.session_state.user_name, 
-                        article['response_array'],
-                        score
-                    )
-                    # if updated_embedding:
-                    #     st.success(f"User embedding updated for article {i+1}")
-                except Exception as e:
-                    st.error(f"Error updating user embedding for article {i+1}: {e}")
+            if article.get("_id") in response_arrays:
+                embedding_feedback.append((response_arrays[article["_id"]], score))
+        
+        # Fold every scored article into the user embedding with a single write
+        if embedding_feedback:
+            try:
+                update_user_embedding_batch(
+                    users_collection, 
+                    st.session_state.user_name, 
+                    embedding_feedback
+                )
+            except Exception as e:
+                st.error(f"Error updating user embedding: {e}")
         
         try:
-            if rankings:
-                rankings_collection.insert_many(rankings)
+            insert_rankings(rankings)
             st.success("Your article scores have been saved!")
         except Exception as e:
             st.error(f"Error saving article scores: {e}")
@@ -220,7 +223,7 @@ if st.button("Submit Satisfaction Score", key="latest_news_satisfaction_button")
                 "comments": comments,
                 "page": "latest_news"
             }
-            satisfaction_collection.insert_one(satisfaction_data)
+            queue_insert(satisfaction_collection, satisfaction_data)
             st.success("Thank you! Your satisfaction score and comments have been saved.")
         except Exception as e:
             st.error(f"Error saving satisfaction score: {e}")
@@ -230,14 +233,17 @@ st.sidebar.markdown("---")
 articles_per_page = st.sidebar.slider("Articles per load:", 5, 20, 10)
 
 if st.sidebar.button("Load More Articles"):
-    current_count = len(st.session_state.latest_articles)
-    new_articles = load_latest_articles(username, current_count + articles_per_page)
+    # Fetch only the slice after the last article on screen; cards already rendered are kept
+    new_articles = []
+    if st.session_state.latest_articles:
+        last_article = st.session_state.latest_articles[-1]
+        new_articles = load_latest_articles(username, articles_per_page, after=page_token(last_article, "published"))
     
-    if len(new_articles) > current_count:
-        st.session_state.latest_articles = new_articles
-        st.session_state.latest_article_contents = [format_article(article) for article in new_articles]
+    if new_articles:
+        st.session_state.latest_articles.extend(new_articles)
+        st.session_state.latest_article_contents.extend(format_article(article) for article in new_articles)
         st.rerun()
     else:
         st.sidebar.warning("No more articles available.")
         
-streamlit_analytics.stop_tracking()
\ No newline at end of file
+streamlit_analytics.stop_tracking()
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from Login import client, db, format_article, load_css, rankings_collection, top_stories, users_collection, satisfaction_collection
+from Login import format_article, load_css, queue_insert, CARD_PROJECTION
+from database import article_popularity_collection, top_stories, satisfaction_collection
 import uuid
 
 # Load CSS
@@ -12,6 +13,9 @@ def get_popular_articles(limit=10):
     """
     Retrieve the most popular articles that still exist in the top_stories collection.
     
+    Reads the article_popularity totals maintained as rankings are inserted, so
+    this is an indexed top-K read instead of a $group over every ranking.
+    
     Args:
     - limit (int): Number of top articles to retrieve
 
@@ -19,43 +23,29 @@ def get_popular_articles(limit=10):
     - List of most popular articles from top_stories collection
     """
     try:
-        # Join rankings with top_stories and calculate total scores
-        ranking_pipeline = [
-            {
-                "$group": {
-                    "_id": "$title",
-                    "total_score": {"$sum": "$rank"}
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "top_stories",
-                    "localField": "_id",
-                    "foreignField": "title",
-                    "as": "article"
-                }
-            },
-            {
-                "$match": {
-                    "article": {"$ne": []}  # Only keep those that still exist in top_stories
-                }
-            },
-            {
-                "$sort": {"total_score": -1}
-            },
-            {
-                "$limit": limit
-            },
-            {
-                "$replaceRoot": {
-                    "newRoot": {
-                        "$mergeObjects": [{"$arrayElemAt": ["$article", 0]}, {"total_score": "$total_score"}]
-                    }
-                }
+        popular_articles = []
+        skipped = 0
+        while len(popular_articles) < limit:
+            # Over-read by the number of deleted articles seen so far
+            batch = list(
+                article_popularity_collection.find({}, {"total_score": 1})
+                .sort([("total_score", -1), ("_id", 1)])
+                .skip(skipped + len(popular_articles))
+                .limit(limit - len(popular_articles))
+            )
+            if not batch:
+                break
+            articles_by_id = {
+                article["_id"]: article
+                for article in top_stories.find({"_id": {"$in": [entry["_id"] for entry in batch]}}, CARD_PROJECTION)
             }
-        ]
-
-        popular_articles = list(rankings_collection.aggregate(ranking_pipeline))
+            for entry in batch:
+                article = articles_by_id.get(entry["_id"])
+                if article is None:  # Only keep those that still exist in top_stories
+                    skipped += 1
+                    continue
+                article["total_score"] = entry["total_score"]
+                popular_articles.append(article)
         return popular_articles
 
     except Exception as e:
@@ -76,7 +66,6 @@ if not st.session_state.popular_articles:
     st.error("No popular articles available to display.")
 else:
     st.write("Most Popular Articles Based on User Rankings:")
-    st.session_state.popular_article_contents = [format_article(article) for article in st.session_state.popular_articles]
     for i, article in enumerate(st.session_state.popular_articles):
         # Create two columns: one for article, one for details
         col1, col2 = st.columns([3, 1])
@@ -124,7 +113,7 @@ if st.button("Submit Satisfaction Score", key="popular_news_satisfaction_button"
                 "comments": comments,
                 "page": "popular_news"
             }
-            satisfaction_collection.insert_one(satisfaction_data)
+            queue_insert(satisfaction_collection, satisfaction_data)
             st.success("Thank you! Your satisfaction score and comments have been saved.")
         except Exception as e:
-            st.error(f"Error saving satisfaction score: {e}")
\ No newline at end of file
+            st.error(f"Error saving satisfaction score: {e}")
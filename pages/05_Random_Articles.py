@@ -4,27 +4,62 @@ import pandas as pd
 import uuid
 from datetime import datetime
 from Login import (
-    client, 
-    db, 
-    rankings_collection, 
-    satisfaction_collection, 
-    highlight_feedback_collection, 
-    users_collection, 
-    format_article, 
+    insert_rankings, 
+    queue_insert,
+    format_article,
+    card_highlights, 
     load_random_articles, 
+    prefetch_random_articles,
     load_css, 
-    update_user_embedding,
-    track_user_article_feedback
+    update_user_embedding_batch,
+    load_response_arrays,
+    track_user_article_feedback_bulk
 )
+from database import satisfaction_collection, highlight_feedback_collection, users_collection
 import streamlit_analytics
 
 # Load CSS
 load_css()
 streamlit_analytics.start_tracking()
 st.title("Random Articles")
+RANDOM_PAGE_SIZE = 5
+RANDOM_POOL_SIZE = 20  # Articles drawn ahead so most clicks are served without a round trip
+RECENTLY_SHOWN = 200  # Shown articles excluded from later draws
+
+username = st.session_state.get("user_name") or None
+
+def draw_random_articles():
+    """
+    Take the next page of random articles from the session pool and top the
+    pool back up on a prefetch worker.
+    """
+    pool = st.session_state.setdefault("random_article_pool", [])
+    shown = st.session_state.setdefault("random_shown_ids", [])
+    refill = st.session_state.get("random_pool_refill")
+    if refill is not None and (refill.done() or len(pool) < RANDOM_PAGE_SIZE):
+        del st.session_state.random_pool_refill
+        try:
+            known = set(shown) | {article["_id"] for article in pool}
+            pool.extend(article for article in refill.result() if article["_id"] not in known)
+        except Exception:
+            pass  # The synchronous draw below reports errors
+    if len(pool) < RANDOM_PAGE_SIZE:
+        pool.extend(load_random_articles(RANDOM_PAGE_SIZE - len(pool), username, shown + [article["_id"] for article in pool]))
+    
+    articles = pool[:RANDOM_PAGE_SIZE]
+    del pool[:RANDOM_PAGE_SIZE]
+    shown.extend(article["_id"] for article in articles)
+    del shown[:-RECENTLY_SHOWN]
+    
+    if len(pool) < RANDOM_POOL_SIZE and "random_pool_refill" not in st.session_state:
+        st.session_state.random_pool_refill = prefetch_random_articles(
+            RANDOM_POOL_SIZE - len(pool), username, shown + [article["_id"] for article in pool]
+        )
+    return articles
+
 # --- Load Random Articles ---
 if "random_articles" not in st.session_state:
-    st.session_state.random_articles = load_random_articles(limit=5)
+    st.session_state.random_articles = draw_random_articles()
     st.session_state.random_article_contents = [format_article(article) for article in st.session_state.random_articles]
 
 # Function to clear all user inputs for random articles
@@ -55,7 +90,7 @@ def clear_random_article_inputs():
 
 def load_new_articles_and_scroll_to_top():
     clear_random_article_inputs()
-    st.session_state.random_articles = load_random_articles(limit=5)
+    st.session_state.random_articles = draw_random_articles()
     st.session_state.random_article_contents = [format_article(article) for article in st.session_state.random_articles]
 
 
@@ -70,12 +105,11 @@ for i, article in enumerate(st.session_state.random_articles):
     col1, col2, col3 = st.columns([3, 2, 1])
     
     with col1:
-        st.session_state.random_article_contents = [format_article(article) for article in st.session_state.random_articles]
         st.markdown(st.session_state.random_article_contents[i], unsafe_allow_html=True)
     
     with col2:
         # Get the highlights data; expect a list of strings.
-        highlights = article.get("highlights", [])
+        highlights = card_highlights(article)
         if isinstance(highlights, list) and len(highlights) > 0:
             total_highlights = len(highlights)
             # Set a unique key for the current article's highlight index in session state
@@ -83,10 +117,8 @@ for i, article in enumerate(st.session_state.random_articles):
             if highlight_key not in st.session_state:
                 st.session_state[highlight_key] = 0
             current_index = st.session_state[highlight_key]
-            # Get the current highlight and truncate if needed
+            # Get the current highlight (already truncated for display)
             current_highlight = highlights[current_index]
-            if len(current_highlight) > 250:
-                current_highlight = current_highlight[:250] + '...'
             highlight_count_text = f"Highlight {current_index + 1} of {total_highlights}"
         else:
             current_highlight = "no highlights available"
@@ -150,8 +182,6 @@ for i, article in enumerate(st.session_state.random_articles):
                 else:
                     try:
                         current_highlight = highlights[current_index]
-                        if len(current_highlight) > 250:
-                            current_highlight = current_highlight[:250] + '...'
                             
                         highlight_feedback_data = {
                             "article_id": str(article.get("_id")),
@@ -165,7 +195,7 @@ for i, article in enumerate(st.session_state.random_articles):
                             "timestamp": datetime.now(),
                             "page": "random_articles"
                         }
-                        highlight_feedback_collection.insert_one(highlight_feedback_data)
+                        queue_insert(highlight_feedback_collection, highlight_feedback_data)
                         st.success("Highlight score saved!")
                     except Exception as e:
                         st.error(f"Error saving highlight score: {e}")
@@ -183,15 +213,21 @@ if st.button("Submit Article Scores", key="random_articles_submit"):
     else:
         submission_id = str(uuid.uuid4())
         rankings = []
+        embedding_feedback = []
+        
+        # Track article ranking feedback for the whole submission at once
+        track_user_article_feedback_bulk(
+            st.session_state.user_name, 
+            [article.get("_id") for article in st.session_state.random_articles], 
+            "random_news"
+        )
+        # Embeddings are left out of the listing queries; fetch them for this submission only
+        response_arrays = load_response_arrays(article.get("_id") for article in st.session_state.random_articles)
         for i, article in enumerate(st.session_state.random_articles):
             score = st.session_state.get(f'random_score_{i}_article')
 
-            track_user_article_feedback(
-                st.session_state.user_name, 
-                article.get("_id"), 
-                "random_news",
-            )
             ranking_data = {
+                "article_id": str(article.get("_id")),
                 "title": article.get("title"),
                 "rank": score,
                 "submission_id": submission_id,
@@ -204,20 +240,22 @@ if st.button("Submit Article Scores", key="random_articles_submit"):
             rankings.append(ranking_data)
 
             # Check if article has a response_array for embedding update
-            if article.get('response_array'):
-                try:
-                    updated_embedding = update_user_embedding(
-                        users_collection, 
-                        st.session_state.user_name, 
-                        article['response_array'],
-                        score
-                    )
-                except Exception as e:
-                    st.error(f"Error updating user embedding for article {i+1}: {e}")
+            if article.get("_id") in response_arrays:
+                embedding_feedback.append((response_arrays[article["_id"]], score))
+        
+        # Fold every scored article into the user embedding with a single write
+        if embedding_feedback:
+            try:
+                update_user_embedding_batch(
+                    users_collection, 
+                    st.session_state.user_name, 
+                    embedding_feedback
+                )
+            except Exception as e:
+                st.error(f"Error updating user embedding: {e}")
         
         try:
-            if rankings:
-                rankings_collection.insert_many(rankings)
+            insert_rankings(rankings)
             st.success("Your article scores have been saved!")
         except Exception as e:
             st.error(f"Error saving article scores: {e}")
@@ -243,9 +281,9 @@ if st.button("Submit Satisfaction Score", key="random_satisfaction_button"):
                 "comments": comments,
                 "page": "random_articles"
             }
-            satisfaction_collection.insert_one(satisfaction_data)
+            queue_insert(satisfaction_collection, satisfaction_data)
             st.success("Thank you! Your satisfaction score and comments have been saved.")
         except Exception as e:
             st.error(f"Error saving satisfaction score: {e}")
 
-streamlit_analytics.stop_tracking()
\ No newline at end of file
+streamlit_analytics.stop_tracking()
@@ -0,0 +1,196 @@
+import heapq
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+import bson
+from pymongo import monitoring
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:  # Older Streamlit releases
+    get_script_run_ctx = None
+
+# Upper bounds (ms) of the duration histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def current_page_and_session():
+    """
+    Name of the page script and Streamlit session running on this thread.
+
+    Returns:
+    - Tuple of (page, session id); (None, None) outside a script run, e.g. on
+      the write-behind thread or in scripts/
+    """
+    ctx = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx else None
+    if ctx is None:
+        return None, None
+    script_path = ctx.main_script_path
+    try:
+        page = ctx.pages_manager.get_pages().get(ctx.pages_manager.current_page_script_hash)
+        if page:
+            script_path = page["script_path"]
+    except AttributeError:
+        pass
+    return os.path.basename(script_path), ctx.session_id
+
+
+class QueryStats(monitoring.CommandListener):
+    """
+    Command listener that aggregates MongoDB command timings per page, command
+    and collection.
+
+    Each entry keeps a count, total and maximum duration, documents returned
+    and a duration histogram; the `slowest` individual commands are kept in
+    full. Reply sizes are only measured when `count_reply_bytes` is set, since
+    that re-encodes every reply the app receives.
+    When `jsonl_path` is set every command is also appended there as one JSON
+    line, rotating at `jsonl_max_bytes` with `jsonl_backups` old files kept.
+    """
+
+    def __init__(self, slowest=20, jsonl_path=None, jsonl_max_bytes=50_000_000, jsonl_backups=3, count_reply_bytes=False):
+        self.slowest_count = slowest
+        self.count_reply_bytes = count_reply_bytes
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._log = None
+        if jsonl_path:
+            handler = logging.handlers.RotatingFileHandler(jsonl_path, maxBytes=jsonl_max_bytes, backupCount=jsonl_backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log = logging.getLogger(f"query_stats.{id(self)}")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            self._log.addHandler(handler)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._entries = {}
+            self._slowest = []  # Min-heap of (duration, sequence, record)
+            self._sequence = 0
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        page, session_id = current_page_and_session()
+        with self._lock:
+            self._in_flight[(event.request_id, event.connection_id)] = (
+                collection if isinstance(collection, str) else None, page, session_id
+            )
+
+    def succeeded(self, event):
+        reply_bytes = len(bson.encode(event.reply)) if self.count_reply_bytes else None
+        self._record(event, reply_documents(event.reply), reply_bytes, failed=False)
+
+    def failed(self, event):
+        self._record(event, 0, 0 if self.count_reply_bytes else None, failed=True)
+
+    def _record(self, event, documents, reply_bytes, failed):
+        with self._lock:
+            collection, page, session_id = self._in_flight.pop((event.request_id, event.connection_id), (None, None, None))
+        duration_ms = event.duration_micros / 1000
+        record = {
+            "time": time.time(),
+            "command": event.command_name,
+            "collection": collection,
+            "page": page,
+            "session": session_id,
+            "duration_ms": round(duration_ms, 3),
+            "documents": documents,
+            "reply_bytes": reply_bytes,
+            "failed": failed
+        }
+        bucket = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if duration_ms <= bound), len(HISTOGRAM_BOUNDS_MS))
+
+        with self._lock:
+            entry = self._entries.get((page, event.command_name, collection))
+            if entry is None:
+                entry = self._entries[(page, event.command_name, collection)] = {
+                    "count": 0,
+                    "failed": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "documents": 0,
+                    "reply_bytes": 0,
+                    "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+                }
+            entry["count"] += 1
+            entry["failed"] += failed
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["documents"] += documents
+            entry["reply_bytes"] += reply_bytes or 0
+            entry["histogram"][bucket] += 1
+
+            self._sequence += 1
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, (duration_ms, self._sequence, record))
+            elif self._slowest and duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (duration_ms, self._sequence, record))
+
+        if self._log:
+            self._log.info(json.dumps(record))
+
+    def summary(self):
+        """
+        Aggregated statistics, one row per (page, command, collection), busiest first.
+
+        p50/p95 are read from the histogram, so they are bucket upper bounds.
+        """
+        with self._lock:
+            entries = [(key, dict(entry, histogram=list(entry["histogram"]))) for key, entry in self._entries.items()]
+        rows = []
+        for (page, command, collection), entry in entries:
+            rows.append({
+                "page": page,
+                "command": command,
+                "collection": collection,
+                "count": entry["count"],
+                "failed": entry["failed"],
+                "mean_ms": round(entry["total_ms"] / entry["count"], 2),
+                "p50_ms": histogram_percentile(entry["histogram"], 0.5),
+                "p95_ms": histogram_percentile(entry["histogram"], 0.95),
+                "max_ms": round(entry["max_ms"], 2),
+                "total_ms": round(entry["total_ms"], 1),
+                "documents": entry["documents"]
+            })
+            if self.count_reply_bytes:
+                rows[-1]["reply_kb"] = round(entry["reply_bytes"] / 1024, 1)
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def histogram(self):
+        """Command counts per duration bucket across all commands"""
+        with self._lock:
+            totals = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+            for entry in self._entries.values():
+                totals = [total + count for total, count in zip(totals, entry["histogram"])]
+        labels = [f"<= {bound} ms" for bound in HISTOGRAM_BOUNDS_MS] + [f"> {HISTOGRAM_BOUNDS_MS[-1]} ms"]
+        return dict(zip(labels, totals))
+
+    def slowest(self):
+        with self._lock:
+            return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+
+def reply_documents(reply):
+    """Documents in a find/aggregate/getMore reply batch, from its length; 0 for other commands"""
+    cursor = reply.get("cursor")
+    if not isinstance(cursor, dict):
+        return 0
+    return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+
+
+def histogram_percentile(histogram, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of commands; None for the open bucket"""
+    target = fraction * sum(histogram)
+    seen = 0
+    for bound, count in zip(HISTOGRAM_BOUNDS_MS, histogram):
+        seen += count
+        if seen >= target:
+            return bound
+    return None
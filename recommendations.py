@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Curated Articles date ranges precomputed by the nightly job: days before the
+# selected date included in the window (see the date filter in 02_Curated_Articles.py)
+RECOMMENDATION_WINDOWS = {"Single day": 0, "Last 3 days": 2, "Last week": 6, "Last month": 29}
+
+
+def window_bounds(selected_date, days_back):
+    """Start and end datetimes of a Curated Articles date range ending on selected_date"""
+    return (
+        datetime.combine(selected_date - timedelta(days=days_back), datetime.min.time()),
+        datetime.combine(selected_date, datetime.max.time())
+    )
+
+
+def recommendation_id(user_name, start_date, end_date):
+    """
+    _id of a user's recommendations for one window.
+
+    Keyed by calendar dates rather than datetimes, since the page's window end
+    (23:59:59.999999) does not survive BSON's millisecond precision.
+    """
+    return f"{user_name}|{start_date:%Y-%m-%d}|{end_date:%Y-%m-%d}"
+
+
+def similarity_scores(user_matrix, article_matrix, metric="cosine"):
+    """
+    Score every (user, article) pair the way the vector search backends do.
+
+    Args:
+    - user_matrix (np.ndarray): (u, d) float32 user embeddings
+    - article_matrix (np.ndarray): (a, d) float32 article response arrays
+    - metric (str): cosine or euclidean
+
+    Returns:
+    - (u, a) float32 scores, higher is better
+    """
+    dots = user_matrix @ article_matrix.T
+    if metric == "cosine":
+        denom = np.linalg.norm(user_matrix, axis=1)[:, np.newaxis] * np.linalg.norm(article_matrix, axis=1)
+        similarity = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+        return (1.0 + similarity) / 2.0
+    squared = (
+        np.einsum("ij,ij->i", user_matrix, user_matrix)[:, np.newaxis]
+        - 2.0 * dots
+        + np.einsum("ij,ij->i", article_matrix, article_matrix)
+    )
+    np.maximum(squared, 0.0, out=squared)
+    return 1.0 / (1.0 + squared)
+
+
+def top_unseen(user_matrix, article_matrix, seen_columns, k, metric="cosine", chunk_size=50_000):
+    """
+    Top-k unseen articles per user, scoring the articles in chunks.
+
+    Only a (users, chunk_size) block of scores exists at a time; each chunk's
+    best k per user are merged into the running best k.
+
+    Args:
+    - user_matrix (np.ndarray): (u, d) user embeddings
+    - article_matrix (np.ndarray): (a, d) article vectors
+    - seen_columns (list): Per user, an array of article column indices to exclude
+    - k (int): Articles kept per user
+    - metric (str): cosine or euclidean
+    - chunk_size (int): Articles scored per block
+
+    Returns:
+    - Tuple of (u, <=k) column indices and matching scores, best first; excluded
+      slots (fewer than k unseen articles) have score -inf
+    """
+    users = len(user_matrix)
+    best_columns = np.empty((users, 0), dtype=np.int64)
+    best_scores = np.empty((users, 0), dtype=np.float32)
+    for start in range(0, len(article_matrix), chunk_size):
+        stop = min(start + chunk_size, len(article_matrix))
+        scores = similarity_scores(user_matrix, article_matrix[start:stop], metric).astype(np.float32)
+        for row, columns in enumerate(seen_columns):
+            in_chunk = columns[(columns >= start) & (columns < stop)]
+            scores[row, in_chunk - start] = -np.inf
+
+        columns = np.concatenate([best_columns, np.broadcast_to(np.arange(start, stop), scores.shape)], axis=1)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            columns = np.take_along_axis(columns, keep, axis=1)
+            scores = np.take_along_axis(scores, keep, axis=1)
+        best_columns, best_scores = columns, scores
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_columns, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def is_fresh(recommendation, version, max_age, now=None):
+    """
+    Whether a stored recommendation can stand in for a live vector search.
+
+    Args:
+    - recommendation (dict): Document from the recommendations collection
+    - version (str): embedding_version of the user's current embedding
+    - max_age (float): Seconds after which an entry is stale
+    - now (datetime, optional): Current time
+
+    Returns:
+    - bool
+    """
+    now = now or datetime.now()
+    return (
+        recommendation.get("embedding_version") == version
+        and (now - recommendation["generated_at"]).total_seconds() < max_age
+    )
+
+
+def merge_candidates(stored, recent):
+    """
+    Merge a stored recommendation with a live retrieval of the articles
+    published since it was generated.
+
+    Args:
+    - stored (list): (article id, score) pairs from the recommendations collection
+    - recent (list): (article id, score) pairs from the live retrieval
+
+    Returns:
+    - List of (article id, score) pairs sorted by (score, id) descending, as a
+      single live retrieval would be
+    """
+    merged = dict(stored)
+    merged.update(recent)
+    return sorted(merged.items(), key=lambda candidate: (candidate[1], candidate[0]), reverse=True)
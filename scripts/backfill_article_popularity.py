@@ -0,0 +1,77 @@
+"""
+One-off backfill of the article_popularity collection from existing rankings.
+
+Older ranking documents only carry the article title, so they are matched to
+top_stories by title, the same way the Popular page used to $lookup them.
+Documents are replaced rather than incremented, so the job can be re-run safely;
+run it before (or while briefly pausing) new submissions to avoid double counting.
+
+Run from the repository root:
+    python scripts/backfill_article_popularity.py
+"""
+import os
+import sys
+from datetime import datetime
+
+import pymongo
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import article_popularity_collection, rankings_collection, top_stories
+
+BATCH_SIZE = 1000
+
+
+def main():
+    groups = list(rankings_collection.aggregate([
+        {
+            "$group": {
+                "_id": {"article_id": "$article_id", "title": "$title", "page": "$page"},
+                "total_score": {"$sum": "$rank"},
+                "count": {"$sum": 1}
+            }
+        }
+    ], allowDiskUse=True))
+
+    # Resolve legacy title-only rankings to article ids
+    titles = list({group["_id"].get("title") for group in groups if not ObjectId.is_valid(group["_id"].get("article_id") or "")})
+    id_by_title = {}
+    for article in top_stories.find({"title": {"$in": titles}}, {"title": 1}):
+        id_by_title.setdefault(article["title"], article["_id"])
+
+    popularity = {}
+    for group in groups:
+        key = group["_id"]
+        article_id = key.get("article_id")
+        if article_id and ObjectId.is_valid(article_id):
+            article_id = ObjectId(article_id)
+        else:
+            article_id = id_by_title.get(key.get("title"))
+        if article_id is None:
+            continue
+        page = key.get("page") or "unknown"
+        entry = popularity.setdefault(article_id, {
+            "_id": article_id,
+            "title": key.get("title"),
+            "total_score": 0,
+            "count": 0,
+            "pages": {},
+            "updated_at": datetime.now()
+        })
+        entry["total_score"] += group["total_score"]
+        entry["count"] += group["count"]
+        page_entry = entry["pages"].setdefault(page, {"total_score": 0, "count": 0})
+        page_entry["total_score"] += group["total_score"]
+        page_entry["count"] += group["count"]
+
+    operations = [pymongo.ReplaceOne({"_id": article_id}, entry, upsert=True) for article_id, entry in popularity.items()]
+    for start in range(0, len(operations), BATCH_SIZE):
+        article_popularity_collection.bulk_write(operations[start:start + BATCH_SIZE], ordered=False)
+
+    article_popularity_collection.create_index([("total_score", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)])
+    print(f"Backfilled popularity for {len(popularity)} articles from {sum(g['count'] for g in groups)} rankings.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Assign the indexed random sampling key `rand` to top_stories articles.
+
+The Random Articles page draws from a random pivot in `rand` order instead of
+$sample, so every article needs a uniform random `rand` in [0, 1). Only
+documents without one are updated, so the job can be re-run at any time; the
+ingest job should set `rand` when it writes new articles.
+
+With --stratify-by FIELD (matching [RANDOM_SAMPLING] stratify_by) the compound
+(FIELD, rand) index used by stratified draws is created as well.
+
+Run from the repository root:
+    python scripts/backfill_random_keys.py [--stratify-by FIELD]
+"""
+import argparse
+import os
+import sys
+
+import pymongo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import top_stories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stratify-by", help="Also index (FIELD, rand) for stratified sampling")
+    args = parser.parse_args()
+
+    # $rand runs server-side (MongoDB 4.4.2+), so no documents are read here
+    result = top_stories.update_many({"rand": {"$exists": False}}, [{"$set": {"rand": {"$rand": {}}}}])
+    top_stories.create_index([("rand", pymongo.ASCENDING)])
+    if args.stratify_by:
+        top_stories.create_index([(args.stratify_by, pymongo.ASCENDING), ("rand", pymongo.ASCENDING)])
+    print(f"Assigned random keys to {result.modified_count} articles.")
+
+
+if __name__ == "__main__":
+    main()
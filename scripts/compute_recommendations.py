@@ -0,0 +1,152 @@
+"""
+Nightly precomputation of each user's top unseen articles for the Curated
+Articles date ranges (single day, 3 days, week and month ending --date).
+
+All eligible user embeddings and the response_array matrix of the month's
+articles are loaded in bulk, scored in (user block x article chunk) matrix
+products, and the top-K unseen articles per user and window are written to the
+`recommendations` collection with unordered bulk writes. The Curated page uses
+an entry while it is fresh and was computed from the user's current embedding,
+and falls back to live vector search otherwise. Entries from earlier runs are
+removed at the end.
+
+Run from the repository root, e.g. nightly from cron:
+    python scripts/compute_recommendations.py [--date YYYY-MM-DD] [--top-k N]
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime
+
+import numpy as np
+import pymongo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit as st
+
+from database import recommendations_collection, top_stories, user_article_feedback_collection, users_collection
+from embedding_math import embedding_version
+from recommendations import RECOMMENDATION_WINDOWS, recommendation_id, top_unseen, window_bounds
+from vector_codec import decode_vector
+
+WRITE_BATCH_SIZE = 500
+
+
+def load_users(min_feedback):
+    """Usernames and embeddings of users the Curated page serves from vector search"""
+    users = users_collection.find(
+        {"feedback_count": {"$gte": min_feedback}, "user_embedding.0": {"$exists": True}},
+        {"username": 1, "user_embedding": 1, "_id": 0}
+    )
+    return [(user["username"], user["user_embedding"]) for user in users]
+
+
+def load_articles(start_date, end_date, dimensions):
+    """Ids, publication dates and vector matrix of the articles in [start_date, end_date]"""
+    ids, published, vectors = [], [], []
+    cursor = top_stories.find(
+        {"published": {"$gte": start_date, "$lte": end_date}, "response_array": {"$exists": True}},
+        {"response_array": 1, "published": 1}
+    )
+    for article in cursor.batch_size(10_000):
+        vector = decode_vector(article.get("response_array"))
+        if vector is not None and vector.shape == (dimensions,):
+            ids.append(article["_id"])
+            published.append(article["published"])
+            vectors.append(vector)
+    return (
+        np.array(ids, dtype=object),
+        np.array(published, dtype="datetime64[ms]"),
+        np.stack(vectors) if vectors else np.empty((0, dimensions), dtype=np.float32)
+    )
+
+
+def load_seen(user_names):
+    """Article ids (as strings) each user has given feedback on"""
+    seen = {user_name: set() for user_name in user_names}
+    for record in user_article_feedback_collection.find({"user_name": {"$in": user_names}}, {"user_name": 1, "article_id": 1, "_id": 0}):
+        seen[record["user_name"]].add(str(record["article_id"]))
+    return seen
+
+
+def main():
+    config = st.secrets.get("VECTOR_SEARCH", {})
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(), help="Last day of every window (default: today)")
+    parser.add_argument("--top-k", type=int, default=config.get("candidate_depth", 500), help="Articles kept per user and window")
+    parser.add_argument("--metric", default=config.get("metric", "cosine"), choices=["cosine", "euclidean"])
+    parser.add_argument("--min-feedback", type=int, default=5, help="Feedback count from which the page uses vector search")
+    parser.add_argument("--user-batch", type=int, default=256, help="Users scored per matrix product")
+    parser.add_argument("--chunk-size", type=int, default=20_000, help="Articles scored per matrix product")
+    args = parser.parse_args()
+
+    generated_at = datetime.now()
+    users = load_users(args.min_feedback)
+    if not users:
+        print("No users with embeddings.")
+        return
+    dimensions = len(users[0][1])
+    users = [(user_name, embedding) for user_name, embedding in users if len(embedding) == dimensions]
+    user_names = [user_name for user_name, _ in users]
+    user_matrix = np.asarray([embedding for _, embedding in users], dtype=np.float32)
+    versions = [embedding_version(embedding) for _, embedding in users]
+    seen = load_seen(user_names)
+
+    month_start, month_end = window_bounds(args.date, max(RECOMMENDATION_WINDOWS.values()))
+    article_ids, published, article_matrix = load_articles(month_start, month_end, dimensions)
+    print(f"Scoring {len(users)} users against {len(article_ids)} articles.")
+
+    written = 0
+    for window, days_back in RECOMMENDATION_WINDOWS.items():
+        start_date, end_date = window_bounds(args.date, days_back)
+        columns = np.flatnonzero(published >= np.datetime64(start_date, "ms"))
+        window_ids = article_ids[columns]
+        window_matrix = article_matrix[columns]
+        position = {str(article_id): i for i, article_id in enumerate(window_ids)}
+
+        operations = []
+        for block_start in range(0, len(users), args.user_batch):
+            block = range(block_start, min(block_start + args.user_batch, len(users)))
+            seen_columns = [
+                np.array([position[article_id] for article_id in seen[user_names[row]] if article_id in position], dtype=np.int64)
+                for row in block
+            ]
+            top_columns, top_scores = top_unseen(
+                user_matrix[block.start:block.stop], window_matrix, seen_columns, args.top_k, args.metric, args.chunk_size
+            )
+            for offset, row in enumerate(block):
+                candidates = [
+                    (window_ids[column], float(score))
+                    for column, score in zip(top_columns[offset], top_scores[offset])
+                    if np.isfinite(score)
+                ]
+                # Same order as a live retrieval, so page tokens resume identically
+                candidates.sort(key=lambda candidate: (candidate[1], candidate[0]), reverse=True)
+                operations.append(pymongo.ReplaceOne(
+                    {"_id": recommendation_id(user_names[row], start_date, end_date)},
+                    {
+                        "user_name": user_names[row],
+                        "window": window,
+                        "start": start_date,
+                        "end": end_date,
+                        "embedding_version": versions[row],
+                        "generated_at": generated_at,
+                        "candidates": [[article_id, score] for article_id, score in candidates]
+                    },
+                    upsert=True
+                ))
+                if len(operations) == WRITE_BATCH_SIZE:
+                    recommendations_collection.bulk_write(operations, ordered=False)
+                    written += len(operations)
+                    operations = []
+        if operations:
+            recommendations_collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+
+    removed = recommendations_collection.delete_many({"generated_at": {"$lt": generated_at}}).deleted_count
+    print(f"Wrote {written} recommendation lists, removed {removed} from earlier runs.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Remove duplicate user_article_feedback rows so the unique feedback index can
+be built.
+
+Double submits from before the feedback upserts were idempotent left several
+rows per (user_name, article_id, feedback_type); the unique index that makes
+the upserts idempotent cannot be created while they exist. The newest row of
+each group is kept. `scripts/ensure_indexes.py --dedupe-feedback` runs the same
+cleanup before building the index; the app never deletes feedback rows itself.
+
+Run from the repository root:
+    python scripts/dedupe_feedback.py [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import user_article_feedback_collection
+from indexes import remove_duplicate_feedback
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only count the duplicate rows")
+    args = parser.parse_args()
+
+    removed = remove_duplicate_feedback(user_article_feedback_collection, dry_run=args.dry_run)
+    print(f"{'Found' if args.dry_run else 'Removed'} {removed} duplicate feedback rows.")
+
+
+if __name__ == "__main__":
+    main()
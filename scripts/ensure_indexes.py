@@ -0,0 +1,69 @@
+"""
+Create the indexes the app queries rely on and report page queries that still
+scan whole collections.
+
+The app runs the same index bootstrap at startup; this script is for deploys
+and for checking a database by hand. With --dedupe-feedback, duplicate feedback
+rows are removed (newest kept) before the unique feedback index is built; the
+app never deletes them itself. Every page query in indexes.py is explained
+afterwards, and the script exits non-zero if an index could not be built or any
+winning plan is a COLLSCAN, so it can gate a deploy.
+
+Run from the repository root:
+    python scripts/ensure_indexes.py [--check-only] [--dedupe-feedback] [--stratify-by FIELD]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit as st
+
+from database import get_database
+from indexes import FEEDBACK_UNIQUE_INDEX, USERNAME_UNIQUE_INDEX, duplicate_usernames, ensure_indexes, explain_page_queries, index_problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--check-only", action="store_true", help="Only explain the page queries, create nothing")
+    parser.add_argument(
+        "--dedupe-feedback", action="store_true",
+        help="Delete duplicate feedback rows (newest kept) before building the unique feedback index"
+    )
+    parser.add_argument(
+        "--stratify-by",
+        default=st.secrets.get("RANDOM_SAMPLING", {}).get("stratify_by"),
+        help="Also index (FIELD, rand) for stratified sampling (default: [RANDOM_SAMPLING] stratify_by)"
+    )
+    args = parser.parse_args()
+
+    database = get_database()
+    problems = []
+    if not args.check_only:
+        report = ensure_indexes(database, args.stratify_by, dedupe_feedback=args.dedupe_feedback)
+        for entry in report:
+            print(f"{entry['status']:<9} {entry['collection']}.{entry['index']} {entry['keys']}")
+            if entry["duplicates_removed"]:
+                print(f"{'':<9} removed {entry['duplicates_removed']} duplicate rows first")
+        problems = index_problems(report)
+        if any(entry["index"] == FEEDBACK_UNIQUE_INDEX for entry in problems) and not args.dedupe_feedback:
+            print(f"{'':<9} rerun with --dedupe-feedback (or run scripts/dedupe_feedback.py) to remove duplicate feedback rows")
+        if any(entry["index"] == USERNAME_UNIQUE_INDEX for entry in problems):
+            for duplicate in duplicate_usernames(database["users"]):
+                print(f"{'':<9} username {duplicate['username']!r} is held by {duplicate['count']} users")
+
+    collscans = 0
+    print()
+    for plan in explain_page_queries(database):
+        flag = "COLLSCAN" if plan["collscan"] else "ok"
+        collscans += plan["collscan"]
+        print(f"{flag:<9} [{plan['page']}] {plan['collection']}: {plan['query']} ({plan['plan']})")
+    if problems:
+        sys.exit(f"{len(problems)} required indexes are not in place; see the status above.")
+    if collscans:
+        sys.exit(f"{collscans} page queries scan a whole collection.")
+
+
+if __name__ == "__main__":
+    main()
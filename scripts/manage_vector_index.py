@@ -0,0 +1,81 @@
+"""
+Create or update the Atlas Vector Search index on top_stories.
+
+The curated feed passes its date window to $vectorSearch as a pre-filter, which
+Atlas only accepts on paths declared as `filter` fields of the index. This
+script writes the index definition: the `response_array` vector field plus one
+filter field per --filter-field (default: [VECTOR_SEARCH] filter_fields). An
+existing index of the same name is updated in place; Atlas rebuilds it in the
+background and keeps serving the old definition until the build finishes.
+
+Run from the repository root:
+    python scripts/manage_vector_index.py [--filter-field FIELD ...] [--dry-run]
+"""
+import argparse
+import json
+import os
+import sys
+
+from pymongo.operations import SearchIndexModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit as st
+
+from database import top_stories
+from vector_codec import decode_vector
+from vector_index import DEFAULT_FILTER_FIELDS
+
+VECTOR_PATH = "response_array"
+
+
+def index_definition(dimensions, similarity, filter_fields):
+    """
+    Build a vectorSearch index definition.
+
+    Args:
+    - dimensions (int): Length of the stored embeddings
+    - similarity (str): cosine, euclidean or dotProduct
+    - filter_fields (list): Paths usable in the $vectorSearch filter
+
+    Returns:
+    - Index definition dict
+    """
+    fields = [{"type": "vector", "path": VECTOR_PATH, "numDimensions": dimensions, "similarity": similarity}]
+    fields += [{"type": "filter", "path": field} for field in filter_fields]
+    return {"fields": fields}
+
+
+def main():
+    config = st.secrets.get("VECTOR_SEARCH", {})
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--name", default="vector_index", help="Search index name")
+    parser.add_argument("--similarity", default=config.get("metric", "cosine"), choices=["cosine", "euclidean", "dotProduct"])
+    parser.add_argument("--dimensions", type=int, help="Embedding length (default: read from an article)")
+    parser.add_argument("--filter-field", action="append", dest="filter_fields", help="Filter field path (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the definition without applying it")
+    args = parser.parse_args()
+
+    dimensions = args.dimensions
+    if dimensions is None:
+        sample = top_stories.find_one({VECTOR_PATH: {"$exists": True}}, {VECTOR_PATH: 1})
+        if sample is None:
+            sys.exit(f"No article has {VECTOR_PATH}; pass --dimensions")
+        dimensions = len(decode_vector(sample[VECTOR_PATH]))
+
+    filter_fields = args.filter_fields or list(config.get("filter_fields", DEFAULT_FILTER_FIELDS))
+    definition = index_definition(dimensions, args.similarity, filter_fields)
+    print(json.dumps(definition, indent=2))
+    if args.dry_run:
+        return
+
+    if list(top_stories.list_search_indexes(args.name)):
+        top_stories.update_search_index(args.name, definition)
+        print(f"Updated search index {args.name}.")
+    else:
+        top_stories.create_search_index(SearchIndexModel(definition=definition, name=args.name, type="vectorSearch"))
+        print(f"Created search index {args.name}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Convert stored user embeddings to sufficient statistics.
+
+Embedding updates are applied server-side to embedding_sum (the weighted sum
+of rated article vectors) and embedding_weight, which for an existing user are
+user_embedding * feedback_count and feedback_count. This sets them on every
+users document that has a user_embedding but no embedding_sum, in one
+server-side update; documents already converted are left alone, so the script
+can be re-run. Updates also derive the statistics on the fly for documents the
+script has not reached yet, so it can run while the app is serving.
+
+Run from the repository root:
+    python scripts/migrate_embedding_statistics.py
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import users_collection
+from embedding_math import statistics_from_embedding_stage
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.split("\n\n")[0]).parse_args()
+
+    result = users_collection.update_many(
+        {"user_embedding": {"$type": "array"}, "embedding_sum": {"$exists": False}},
+        [statistics_from_embedding_stage()]
+    )
+    print(f"Converted {result.modified_count} users to embedding statistics.")
+
+
+if __name__ == "__main__":
+    main()
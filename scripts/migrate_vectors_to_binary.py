@@ -0,0 +1,65 @@
+"""
+Rewrite top_stories.response_array from BSON arrays of doubles to BSON float32
+binary vectors (see vector_codec.encode_vector).
+
+Documents are read in _id order in batches and written back with unordered
+bulk writes. Only documents whose response_array is still an array are
+selected (and the write re-checks it), so an interrupted run resumes where it
+stopped; --after <ObjectId> additionally skips everything up to a known _id.
+Every reader decodes all forms, so the app can serve during the migration.
+
+--packed writes raw float32 bytes instead of BSON vectors. They decode faster
+in Python, but Atlas Vector Search cannot index them, so use it only with
+[VECTOR_SEARCH] backend = "numpy".
+
+users.user_embedding stays an array: it is rewritten server-side from the
+embedding statistics on every feedback update.
+
+Run from the repository root:
+    python scripts/migrate_vectors_to_binary.py [--batch-size N] [--after ID] [--packed]
+"""
+import argparse
+import os
+import sys
+
+import pymongo
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import top_stories
+from vector_codec import encode_vector
+
+FIELD = "response_array"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--after", help="Only process documents with _id greater than this ObjectId")
+    parser.add_argument("--packed", action="store_true", help="Store packed float32 bytes (numpy backend only)")
+    args = parser.parse_args()
+
+    query = {FIELD: {"$type": "array"}}
+    if args.after:
+        query["_id"] = {"$gt": ObjectId(args.after)}
+
+    converted = 0
+    operations = []
+    cursor = top_stories.find(query, {FIELD: 1}).sort("_id", 1).batch_size(args.batch_size)
+    for article in cursor:
+        operations.append(pymongo.UpdateOne(
+            {"_id": article["_id"], FIELD: {"$type": "array"}},
+            {"$set": {FIELD: encode_vector(article[FIELD], packed=args.packed)}}
+        ))
+        if len(operations) == args.batch_size:
+            converted += top_stories.bulk_write(operations, ordered=False).modified_count
+            print(f"  converted {converted} (last _id {article['_id']})")
+            operations = []
+    if operations:
+        converted += top_stories.bulk_write(operations, ordered=False).modified_count
+    print(f"Converted {converted} vectors to {'packed ' if args.packed else ''}float32 binary.")
+
+
+if __name__ == "__main__":
+    main()
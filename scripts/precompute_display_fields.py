@@ -0,0 +1,90 @@
+"""
+Precompute the card display fields (display_snippet, display_authors,
+display_highlights) on top_stories so pages do not re-derive them per render.
+
+Documents are read in _id order in batches, computed in a process pool and
+written back with unordered bulk writes. Only documents whose display_version
+is not current are selected, so an interrupted run resumes where it stopped;
+--after <ObjectId> additionally skips everything up to a known _id.
+
+The same cards.display_fields function should be applied by the ingest job
+when new articles are written.
+
+Run from the repository root:
+    python scripts/precompute_display_fields.py [--workers N] [--batch-size N] [--after ID]
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pymongo
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import DISPLAY_VERSION, display_fields
+from database import top_stories
+
+SOURCE_FIELDS = {"summary": 1, "authors": 1, "highlights": 1}
+
+
+def compute_batch(articles):
+    """Worker: return (_id, fields) pairs for a batch of documents"""
+    return [(article["_id"], display_fields(article)) for article in articles]
+
+
+def read_batches(collection, after, batch_size):
+    query = {"display_version": {"$ne": DISPLAY_VERSION}}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    batch = []
+    for article in collection.find(query, SOURCE_FIELDS).sort("_id", 1).batch_size(batch_size):
+        batch.append(article)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--after", help="Only process documents with _id greater than this ObjectId")
+    args = parser.parse_args()
+
+    after = ObjectId(args.after) if args.after else None
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        pending = set()
+        batches = read_batches(top_stories, after, args.batch_size)
+        for batch in batches:
+            pending.add(pool.submit(compute_batch, batch))
+            # Keep the pool busy without reading the whole collection into memory
+            if len(pending) < 2 * args.workers:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            written += write_results(top_stories, done)
+        written += write_results(top_stories, pending)
+    print(f"Precomputed display fields for {written} articles.")
+
+
+def write_results(collection, futures):
+    written = 0
+    for future in futures:
+        results = future.result()
+        if not results:
+            continue
+        collection.bulk_write(
+            [pymongo.UpdateOne({"_id": article_id}, {"$set": fields}) for article_id, fields in results],
+            ordered=False
+        )
+        written += len(results)
+        print(f"  wrote {len(results)}")
+    return written
+
+
+if __name__ == "__main__":
+    main()
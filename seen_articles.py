@@ -0,0 +1,109 @@
+import numpy as np
+from bson.objectid import ObjectId
+
+
+def _to_key(article_id):
+    """Return the 12-byte ObjectId key for an id, or None if it is not a valid ObjectId"""
+    if isinstance(article_id, ObjectId):
+        binary = article_id.binary
+    elif ObjectId.is_valid(article_id):
+        binary = ObjectId(article_id).binary
+    else:
+        return None
+    # numpy strips trailing NUL bytes from "S" items, so compare in numpy's form
+    return np.array(binary, dtype="S12")[()]
+
+
+class SeenArticleSet:
+    """
+    Compact set of article ids a user has already given feedback on.
+
+    Ids are held as a sorted array of raw 12-byte ObjectIds (12 bytes per
+    article instead of a Python str/ObjectId object each), so membership is a
+    binary search and filtering a batch of candidates is one vectorized lookup.
+    """
+
+    def __init__(self, article_ids=()):
+        keys = [key for key in map(_to_key, article_ids) if key is not None]
+        self._keys = np.unique(np.array(keys, dtype="S12"))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, article_id):
+        key = _to_key(article_id)
+        if key is None or len(self._keys) == 0:
+            return False
+        position = np.searchsorted(self._keys, key)
+        return position < len(self._keys) and self._keys[position] == key
+
+    def add(self, article_id):
+        """Record a newly rated article, keeping the array sorted"""
+        key = _to_key(article_id)
+        if key is None:
+            return
+        position = np.searchsorted(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            return
+        self._keys = np.insert(self._keys, position, key)
+
+    def union(self, article_ids):
+        """
+        Return a new set holding these ids as well; this set is left unchanged.
+
+        Args:
+        - article_ids (iterable): Extra ids, e.g. articles already on screen
+
+        Returns:
+        - SeenArticleSet
+        """
+        combined = SeenArticleSet(article_ids)
+        combined._keys = np.union1d(self._keys, combined._keys)
+        return combined
+
+    def filter_unseen(self, articles):
+        """
+        Drop articles whose _id is in the set, preserving order.
+
+        Args:
+        - articles (list): Article documents with an _id field
+
+        Returns:
+        - List of articles not yet seen
+        """
+        articles = list(articles)
+        if not articles or len(self._keys) == 0:
+            return articles
+        keys = np.array([_to_key(article.get("_id")) or b"" for article in articles], dtype="S12")
+        seen = np.isin(keys, self._keys, assume_unique=False)
+        return [article for article, is_seen in zip(articles, seen) if not is_seen]
+
+    def take_unseen(self, cursor, offset=0, limit=5):
+        """
+        Consume a cursor lazily, skipping seen articles, then `offset` unseen ones.
+
+        Reading stops as soon as `limit` articles are found and the cursor is
+        closed, so an unlimited cursor only fetches the batches needed.
+
+        Args:
+        - cursor (iterable): Article documents in the desired order
+        - offset (int): Number of unseen documents to skip
+        - limit (int): Number of unseen documents to return
+
+        Returns:
+        - List of at most `limit` unseen articles
+        """
+        results = []
+        skipped = 0
+        for article in cursor:
+            if article.get("_id") in self:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            results.append(article)
+            if len(results) >= limit:
+                break
+        if hasattr(cursor, "close"):
+            cursor.close()
+        return results
@@ -0,0 +1,53 @@
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+
+# BSON binary vector (subtype 9) header: dtype byte, then padding byte
+FLOAT32_VECTOR_HEADER = BinaryVectorDtype.FLOAT32.value + b"\x00"
+
+
+def encode_vector(values, packed=False):
+    """
+    Encode a vector as BSON binary float32.
+
+    4 bytes per element instead of the 8-byte double plus type byte and index
+    key of every BSON array element. The default BSON vector (subtype 9) is
+    what Atlas Vector Search indexes; packed bytes (subtype 0) decode faster in
+    Python but are only usable with the numpy backend.
+
+    Args:
+    - values (list or np.ndarray): Vector elements
+    - packed (bool): Store raw little-endian float32 bytes instead of a BSON vector
+
+    Returns:
+    - bson.binary.Binary of subtype 9, or subtype 0 if packed
+    """
+    data = np.ascontiguousarray(values, dtype="<f4").tobytes()
+    if packed:
+        return Binary(data)
+    return Binary(FLOAT32_VECTOR_HEADER + data, subtype=9)
+
+
+def decode_vector(value):
+    """
+    Return a stored vector as a float32 NumPy array.
+
+    Binary values are wrapped with np.frombuffer, without copying, so the
+    result is read-only; copy it before modifying. Accepts BSON float32
+    binary vectors, raw packed float32 bytes and plain arrays.
+
+    Args:
+    - value (Binary, bytes, list or None): Stored vector
+
+    Returns:
+    - 1-d float32 np.ndarray, or None if value is None
+    """
+    if value is None:
+        return None
+    if isinstance(value, Binary) and value.subtype == 9:
+        if value[:2] == FLOAT32_VECTOR_HEADER:
+            return np.frombuffer(value, dtype="<f4", offset=2)
+        # int8/packed-bit vectors: let bson decode them
+        return np.asarray(value.as_vector().data, dtype=np.float32)
+    if isinstance(value, bytes):
+        return np.frombuffer(value, dtype="<f4")
+    return np.asarray(value, dtype=np.float32)
@@ -0,0 +1,221 @@
+import operator
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from vector_codec import decode_vector
+
+# Default pre-filter fields of both backends: the curated date window, and the
+# article category so feeds can be narrowed to a user's interests
+DEFAULT_FILTER_FIELDS = ("published", "category")
+
+# Operators accepted in search filters, the subset Atlas $vectorSearch filters use
+RANGE_OPERATORS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+class NumpyVectorIndex:
+    """
+    In-process exact vector index over a MongoDB collection.
+
+    All vectors are kept in one contiguous float32 matrix alongside an array of
+    document ids, so a top-K query is a single matrix-vector product followed by
+    argpartition. New documents are picked up by polling for _ids greater than
+    the last one loaded; edits to vectors of already indexed documents are not
+    seen until the index is rebuilt. Vectors may be stored as arrays or as
+    BSON float32 binary vectors (see vector_codec).
+
+    Scores follow the Atlas $vectorSearch conventions so both backends rank the
+    same way:
+    - cosine: (1 + cosine_similarity) / 2
+    - euclidean: 1 / (1 + squared_distance)
+
+    Like Atlas filter fields, the values of `filter_fields` are kept in columns
+    next to the vectors so a search can be restricted before scoring; date
+    fields are stored as datetime64, anything else as Python objects.
+    """
+
+    def __init__(self, collection, path="response_array", metric="cosine", refresh_interval=60, filter_fields=()):
+        if metric not in ("cosine", "euclidean"):
+            raise ValueError(f"Unsupported similarity metric: {metric}")
+        self.collection = collection
+        self.path = path
+        self.metric = metric
+        self.refresh_interval = refresh_interval
+        self.filter_fields = tuple(filter_fields)
+        self._columns = {}
+        self._lock = threading.Lock()
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._ids = np.empty(0, dtype=object)
+        self._size = 0
+        self._dim = None
+        self._last_id = None
+        self._last_refresh = 0.0
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, capacity):
+        # Grow geometrically so appending batches stays amortised O(n)
+        if capacity <= self._matrix.shape[0]:
+            return
+        new_capacity = max(capacity, 2 * self._matrix.shape[0], 1024)
+        matrix = np.empty((new_capacity, self._dim), dtype=np.float32)
+        norms = np.empty(new_capacity, dtype=np.float32)
+        ids = np.empty(new_capacity, dtype=object)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            norms[:self._size] = self._norms[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._norms, self._ids = matrix, norms, ids
+        for field, column in self._columns.items():
+            grown = np.full(new_capacity, None, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[field] = grown
+
+    def refresh(self, force=False):
+        """
+        Load documents inserted since the last refresh.
+
+        Args:
+        - force (bool): Poll even if refresh_interval has not elapsed
+
+        Returns:
+        - Number of vectors added
+        """
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return 0
+
+        with self._lock:
+            query = {self.path: {"$exists": True}}
+            if self._last_id is not None:
+                query["_id"] = {"$gt": self._last_id}
+            projection = {self.path: 1, **{field: 1 for field in self.filter_fields}}
+            cursor = self.collection.find(query, projection).sort("_id", 1)
+
+            new_ids = []
+            new_vectors = []
+            new_values = {field: [] for field in self.filter_fields}
+            for doc in cursor:
+                vector = decode_vector(doc.get(self.path))
+                self._last_id = doc["_id"]
+                if vector is None or vector.ndim != 1 or not len(vector):
+                    continue
+                if self._dim is None:
+                    self._dim = len(vector)
+                if len(vector) != self._dim:
+                    continue
+                new_ids.append(doc["_id"])
+                new_vectors.append(vector)
+                for field in self.filter_fields:
+                    new_values[field].append(doc.get(field))
+
+            self._last_refresh = time.monotonic()
+            if not new_ids:
+                return 0
+
+            block = np.stack(new_vectors)
+            start = self._size
+            end = start + len(new_ids)
+            self._reserve(end)
+            self._matrix[start:end] = block
+            self._norms[start:end] = np.linalg.norm(block, axis=1)
+            self._ids[start:end] = new_ids
+            for field, values in new_values.items():
+                if field not in self._columns:
+                    # The first values seen decide the column type
+                    dtype = "datetime64[ms]" if any(isinstance(value, datetime) for value in values) else object
+                    self._columns[field] = np.full(self._matrix.shape[0], None, dtype=dtype)
+                self._columns[field][start:end] = values
+            self._size = end
+            return len(new_ids)
+
+    def _filter_mask(self, search_filter, n):
+        """Boolean mask of the first n rows matching an MQL-style filter"""
+        mask = np.ones(n, dtype=bool)
+        for field, condition in search_filter.items():
+            if field == "$and":
+                for clause in condition:
+                    mask &= self._filter_mask(clause, n)
+                continue
+            if field not in self._columns:
+                raise ValueError(f"Field {field} is not a filter field of this index")
+            column = self._columns[field][:n]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                mask &= self._condition_mask(column, op, value)
+        return mask
+
+    @staticmethod
+    def _condition_mask(column, op, value):
+        is_date = column.dtype.kind == "M"
+        if op in ("$in", "$nin"):
+            if is_date:
+                hits = np.isin(column, np.array(value, dtype=column.dtype))
+            else:
+                values = set(value)
+                hits = np.fromiter((item in values for item in column), dtype=bool, count=len(column))
+            return hits if op == "$in" else ~hits
+        if op in ("$eq", "$ne"):
+            hits = column == (np.datetime64(value, "ms") if is_date else value)
+            return np.asarray(hits, dtype=bool) if op == "$eq" else ~np.asarray(hits, dtype=bool)
+        if op in RANGE_OPERATORS:
+            compare = RANGE_OPERATORS[op]
+            if is_date:
+                # NaT compares false, so undated documents never match a range
+                return compare(column, np.datetime64(value, "ms"))
+            return np.fromiter((item is not None and compare(item, value) for item in column), dtype=bool, count=len(column))
+        raise ValueError(f"Unsupported filter operator: {op}")
+
+    def search(self, query_vector, k, search_filter=None):
+        """
+        Return the k nearest documents to query_vector.
+
+        Args:
+        - query_vector (list): Query embedding
+        - k (int): Number of results to return
+        - search_filter (dict, optional): Pre-filter on filter fields, using
+          $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte and $and as in $vectorSearch
+
+        Returns:
+        - List of (document _id, score) tuples, best match first
+        """
+        self.refresh()
+        with self._lock:
+            n = self._size
+            if n == 0 or k <= 0:
+                return []
+            query = np.asarray(query_vector, dtype=np.float32)
+            if query.shape != (self._dim,):
+                raise ValueError(f"Query vector has dimension {query.size}, index has {self._dim}")
+
+            rows = np.flatnonzero(self._filter_mask(search_filter, n)) if search_filter else None
+            if rows is not None:
+                # Only the matching rows are scored
+                n = len(rows)
+                if n == 0:
+                    return []
+                matrix = self._matrix[rows]
+                norms = self._norms[rows]
+                ids = self._ids[rows]
+            else:
+                matrix = self._matrix[:n]
+                norms = self._norms[:n]
+                ids = self._ids[:n]
+            dots = matrix @ query
+            if self.metric == "cosine":
+                denom = norms * np.linalg.norm(query)
+                similarity = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+                scores = (1.0 + similarity) / 2.0
+            else:
+                squared = norms * norms - 2.0 * dots + np.dot(query, query)
+                np.maximum(squared, 0.0, out=squared)
+                scores = 1.0 / (1.0 + squared)
+
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(ids[i], float(scores[i])) for i in top]
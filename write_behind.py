@@ -0,0 +1,226 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+import pymongo
+
+# Errors worth retrying: the write may succeed once the connection recovers
+TRANSIENT_ERRORS = (pymongo.errors.AutoReconnect, pymongo.errors.NetworkTimeout, pymongo.errors.ConnectionFailure)
+DUPLICATE_KEY = 11000
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Process-wide queue for append-only event inserts, drained by a background thread.
+
+    Documents are grouped per collection and written with insert_many once
+    `batch_size` documents are pending or `flush_interval` seconds have passed.
+    Transient errors are retried with exponential backoff; _ids are assigned on
+    the first attempt, so a retried batch that partly succeeded only produces
+    duplicate-key errors, which are ignored. Pending documents are flushed on
+    close(), which is registered with atexit. A document that cannot be queued
+    within `put_timeout` seconds (queue full, or the worker has died) is
+    inserted synchronously instead.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.5, max_retries=5, max_queue_size=10000, on_flush=None, put_timeout=5.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.put_timeout = put_timeout
+        # Callbacks run with the documents of a collection after each successful insert
+        self.on_flush = on_flush or {}
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._pending_count = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "retries": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+        self._closed = False
+        # Guards _closed and the count of puts between their closed check and enqueue
+        self._state = threading.Condition()
+        self._putting = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, collection, document):
+        """
+        Queue a document for insertion and return immediately.
+
+        Blocks only if the queue is full, which pushes back on callers instead
+        of growing memory without bound, and for at most `put_timeout` seconds.
+
+        Args:
+        - collection: Collection (or CollectionHandle) to insert into
+        - document (dict): Document to insert
+        """
+        with self._state:
+            # After close(), or if the worker has died, nothing would drain the queue
+            queueing = not self._closed and self._thread.is_alive()
+            if queueing:
+                self._putting += 1
+        if not queueing:
+            self._insert_now(collection, document)
+            return
+        try:
+            self._queue.put((collection, document), timeout=self.put_timeout)
+            queued = True
+        except queue.Full:
+            queued = False
+        finally:
+            with self._state:
+                self._putting -= 1
+                self._state.notify_all()
+        if not queued:
+            logger.warning("Write-behind queue full for %.1fs; inserting directly", self.put_timeout)
+            self._insert_now(collection, document)
+            return
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+
+    def _insert_now(self, collection, document):
+        """Synchronous fallback for put(), running the same on_flush callback"""
+        collection.insert_one(document)
+        name = getattr(collection, "name", id(collection))
+        callback = self.on_flush.get(name)
+        if callback:
+            try:
+                callback([document])
+            except Exception as e:
+                logger.exception("Write-behind callback for %s failed: %s", name, e)
+
+    def put_many(self, collection, documents):
+        for document in documents:
+            self.put(collection, document)
+
+    def stats(self):
+        """Queue depth and flush latency figures for monitoring backpressure"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["depth"] = self._queue.qsize() + self._pending_count
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+
+    def close(self, timeout=10):
+        """Flush everything still queued and stop the background thread"""
+        with self._state:
+            if self._closed:
+                return
+            self._closed = True
+            # Puts already past their closed check finish first, so none lands behind the stop marker
+            self._state.wait_for(lambda: self._putting == 0, timeout)
+        if not self._thread.is_alive():
+            if self._queue.qsize():
+                logger.error("Write-behind worker had stopped; %d queued documents were not written", self._queue.qsize())
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+            self._thread.join(timeout)
+        except queue.Full:
+            pass
+        if self._thread.is_alive():
+            logger.error("Write-behind worker did not finish within %ss (queue depth %d)", timeout, self._queue.qsize())
+
+    def _run(self):
+        pending = defaultdict(list)
+        collections = {}
+        oldest = None
+        while True:
+            wait = self.flush_interval if oldest is None else max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                # Anything still queued is written with the final flush
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        self._add(pending, collections, item)
+                self._flush(pending, collections)
+                return
+            if item is not None:
+                self._add(pending, collections, item)
+                if oldest is None:
+                    oldest = time.monotonic()
+
+            if self._pending_count >= self.batch_size or (oldest is not None and time.monotonic() - oldest >= self.flush_interval):
+                self._flush(pending, collections)
+                oldest = None
+
+    def _add(self, pending, collections, item):
+        collection, document = item
+        key = getattr(collection, "name", id(collection))
+        collections[key] = collection
+        pending[key].append(document)
+        self._pending_count += 1
+
+    def _flush(self, pending, collections):
+        for key, documents in list(pending.items()):
+            if documents:
+                self._write(collections[key], key, documents)
+        pending.clear()
+        self._pending_count = 0
+
+    def _write(self, collection, name, documents):
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            try:
+                collection.insert_many(documents, ordered=False)
+                break
+            except pymongo.errors.BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if all(error.get("code") == DUPLICATE_KEY for error in errors):
+                    break  # Already written by an earlier attempt
+                logger.error("Write-behind insert into %s failed: %s", name, e)
+                self._record(started, written=0, dropped=len(documents))
+                return
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    logger.error("Write-behind gave up on %d documents for %s: %s", len(documents), name, e)
+                    self._record(started, written=0, dropped=len(documents))
+                    return
+                with self._stats_lock:
+                    self._stats["retries"] += 1
+                time.sleep(min(0.1 * 2 ** attempt, 5))
+            except Exception as e:
+                logger.exception("Write-behind insert into %s failed: %s", name, e)
+                self._record(started, written=0, dropped=len(documents))
+                return
+
+        self._record(started, written=len(documents), dropped=0)
+        callback = self.on_flush.get(name)
+        if callback:
+            try:
+                callback(documents)
+            except Exception as e:
+                logger.exception("Write-behind callback for %s failed: %s", name, e)
+
+    def _record(self, started, written, dropped):
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._stats_lock:
+            self._stats["written"] += written
+            self._stats["dropped"] += dropped
+            self._stats["flushes"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms